@@ -1,16 +1,14 @@
 from flask import Flask
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
-from elasticsearch import Elasticsearch
+from app.engine import RoutingSQLAlchemy, replica_binds
 
 app = Flask(__name__)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
+app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
 login = LoginManager(app)
-app.elasticsearch = Elasticsearch([app.config['ELASTICSEARCH_URL']]) \
-    if app.config['ELASTICSEARCH_URL'] else None
 
-from app import routes, models, errors
\ No newline at end of file
+from app import routes, models, errors, cli, featured, assets, identity, api
\ No newline at end of file
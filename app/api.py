@@ -0,0 +1,258 @@
+'''
+JSON API under /api/v1 for the catalogue, carts, checkout and vendor orders. Listings are
+keyset-paginated (pass the returned `next` back as ?after=), ?fields= picks the columns
+to send, and GET responses carry an ETag so unchanged data comes back as a 304. Cart,
+checkout and vendor calls use the same signed in session as the site.
+'''
+
+import hashlib
+import json
+from flask import Blueprint, Response, request
+from flask_login import current_user
+from app import app, db
+from app.models import Item, CartItem, Order
+
+blueprint = Blueprint('api', __name__, url_prefix='/api/v1')
+
+ITEM_FIELDS = ('id', 'title', 'description', 'price', 'stock', 'featured', 'image',
+    'image_key', 'vendorid')
+LINE_FIELDS = ('itemid', 'title', 'price', 'quantity')
+ORDER_FIELDS = ('id', 'itemid', 'title', 'quantity', 'price', 'name', 'address')
+
+class ApiError(Exception):
+    '''
+    Raise from a view to answer with {"error": >message<} and >status<.
+    '''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+@blueprint.errorhandler(ApiError)
+def api_error(error):
+    return respond({'error': error.message}, error.status)
+
+@blueprint.before_request
+def require_json():
+    #a cross-site form can't send application/json without a CORS preflight, which this
+    #API never allows, so other sites can't act with a visitor's session cookie. Forms
+    #can't send DELETE at all, so a DELETE only needs checking if it carries a body
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or (request.method == 'DELETE'
+            and not request.get_data()):
+        return
+    if not request.is_json:
+        raise ApiError(415, 'Send requests as application/json.')
+
+def encode(data):
+    #compact separators trim every response; ensure_ascii=False skips escaping non-ASCII
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def respond(data, status=200, private=False):
+    '''
+    JSON response for >data<. Successful GETs get a strong ETag and answer a matching
+    If-None-Match with 304; >private< responses (anything per user) are kept out of
+    shared caches.
+    '''
+
+    response = Response(encode(data), status=status, mimetype='application/json')
+    if request.method != 'GET' or status != 200:
+        return response
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+def fields(allowed, always=()):
+    '''
+    The fields named in ?fields= (all of >allowed< if it's missing), plus >always<.
+    '''
+
+    if not request.args.get('fields'):
+        return list(allowed)
+    chosen = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    unknown = [field for field in chosen if field not in allowed]
+    if unknown:
+        raise ApiError(400, 'Unknown fields: {}.'.format(', '.join(unknown)))
+    return [field for field in always if field not in chosen] + chosen
+
+def limit():
+    per_page = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(per_page, app.config['API_MAX_PAGE_SIZE']))
+
+def rows(names, query):
+    return [dict(zip(names, row)) for row in query]
+
+def page(names, query, key, per_page):
+    '''
+    Run keyset-paginated >query< for one more row than >per_page< to see if there's a
+    next page. Returns {"data": [...], "next": cursor or null}.
+    '''
+
+    data = rows(names, query.limit(per_page + 1))
+    cursor = data[per_page - 1][key] if len(data) > per_page else None
+    return {'data': data[:per_page], 'next': cursor}
+
+def json_body():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError(400, 'Expected a JSON object.')
+    return body
+
+def integer(body, name, default=None):
+    value = body.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ApiError(400, '"{}" must be an integer.'.format(name))
+    return value
+
+def signed_in(usertype):
+    if current_user.is_anonymous:
+        raise ApiError(401, 'Sign in first.')
+    if current_user.usertype != usertype:
+        raise ApiError(403, 'Only a {} can do that.'.format(usertype.lower()))
+
+def customer_cart():
+    signed_in('Customer')
+    cart = current_user.cart
+    if cart is None:
+        raise ApiError(404, 'You have no cart.')
+    return cart
+
+def get_item(itemid):
+    item = Item.query.get(itemid)
+    if item is None:
+        raise ApiError(404, 'No such item.')
+    return item
+
+##catalogue
+@blueprint.route('/items')
+def items():
+    names = fields(ITEM_FIELDS, always=['id'])
+    query = db.session.query(*[getattr(Item, name) for name in names]).filter(
+        Item.id > request.args.get('after', 0, type=int))
+    if request.args.get('vendor'):
+        query = query.filter(Item.vendorid == request.args.get('vendor', type=int))
+    if request.args.get('featured'):
+        query = query.filter(Item.featured == True)
+    return respond(page(names, query.order_by(Item.id), 'id', limit()))
+
+@blueprint.route('/items/<int:itemid>')
+def item(itemid):
+    names = fields(ITEM_FIELDS)
+    row = db.session.query(*[getattr(Item, name) for name in names]).filter(
+        Item.id == itemid).first()
+    if row is None:
+        raise ApiError(404, 'No such item.')
+    return respond(dict(zip(names, row)))
+
+@blueprint.route('/search')
+def search():
+    if not request.args.get('q'):
+        raise ApiError(400, 'Give a search with ?q=.')
+    names = fields(ITEM_FIELDS)
+    found, total, cursor = Item.search(request.args['q'],
+        max(request.args.get('page', 1, type=int), 1), limit(), request.args.get('after'))
+    return respond({'data': [dict((name, getattr(item, name)) for name in names)
+        for item in found], 'total': total, 'next': cursor})
+
+##cart
+def cart_body(cart):
+    names = fields(LINE_FIELDS, always=['itemid'])
+    columns = {'itemid': CartItem.itemid, 'quantity': CartItem.quantity,
+        'title': Item.title, 'price': Item.price}
+    lines = db.session.query(*[columns[name] for name in names]).join(
+        Item, Item.id == CartItem.itemid).filter(CartItem.cartid == cart.id).order_by(CartItem.id)
+    return {'cartprice': cart.cartprice, 'lines': rows(names, lines)}
+
+@blueprint.route('/cart')
+def cart():
+    return respond(cart_body(customer_cart()), private=True)
+
+@blueprint.route('/cart/items', methods=['POST'])
+def cart_add():
+    cart = customer_cart()
+    body = json_body()
+    quantity = integer(body, 'quantity', 1)
+    if quantity < 1:
+        raise ApiError(400, '"quantity" must be at least 1.')
+    item = get_item(integer(body, 'itemid'))
+    return respond({'itemid': item.id, 'total': cart.add_item(item, quantity)}, 201)
+
+@blueprint.route('/cart/items/<int:itemid>', methods=['PUT'])
+def cart_set(itemid):
+    cart = customer_cart()
+    quantity = integer(json_body(), 'quantity')
+    if not CartItem.query.filter_by(cartid=cart.id, itemid=itemid).count():
+        raise ApiError(404, 'That item is not in your cart.')
+    cart.set_quantity(get_item(itemid), quantity)
+    return respond(cart_body(cart))
+
+@blueprint.route('/cart/items/<int:itemid>', methods=['DELETE'])
+def cart_remove(itemid):
+    cart = customer_cart()
+    cart.set_quantities({itemid: 0})
+    return respond(cart_body(cart))
+
+@blueprint.route('/cart/batch', methods=['POST'])
+def cart_batch():
+    '''
+    Set several quantities at once from {"items": {"<itemid>": quantity, ...}}. Items not
+    in the cart yet are added; a quantity of 0 removes the line.
+    '''
+
+    cart = customer_cart()
+    wanted = json_body().get('items')
+    if not isinstance(wanted, dict):
+        raise ApiError(400, '"items" must map item ids to quantities.')
+    try:
+        quantities = dict((int(itemid), int(quantity)) for itemid, quantity in wanted.items())
+    except (TypeError, ValueError):
+        raise ApiError(400, '"items" must map item ids to quantities.')
+
+    #check every item before changing anything, then apply the whole batch in one commit
+    known = set(itemid for itemid, in db.session.query(Item.id).filter(
+        Item.id.in_(list(quantities))))
+    unknown = sorted(set(quantities) - known)
+    if unknown:
+        raise ApiError(404, 'No such items: {}.'.format(', '.join(str(id) for id in unknown)))
+    cart.set_quantities(quantities, add=True)
+    return respond(cart_body(cart))
+
+@blueprint.route('/checkout', methods=['POST'])
+def checkout():
+    placed, short = customer_cart().checkout()
+    if short:
+        return respond({'error': 'Not enough stock.', 'short': [item.id for item in short]}, 409)
+    if not placed:
+        raise ApiError(400, 'Cart is empty.')
+    return respond({'placed': placed})
+
+##vendors
+@blueprint.route('/vendor/orders')
+def vendor_orders():
+    signed_in('Vendor')
+    names = fields(ORDER_FIELDS, always=['id'])
+    columns = dict((name, getattr(Order, name)) for name in ORDER_FIELDS if name != 'title')
+    columns['title'] = Item.title
+    query = db.session.query(*[columns[name] for name in names]).join(
+        Item, Item.id == Order.itemid).filter(Order.vendorid == current_user.id,
+        Order.id > request.args.get('after', 0, type=int)).order_by(Order.id)
+    return respond(page(names, query, 'id', limit()), private=True)
+
+@blueprint.route('/vendor/summary')
+def vendor_summary():
+    signed_in('Vendor')
+    return respond({'data': rows(('itemid', 'title', 'revenue', 'units', 'orders'),
+        Order.vendor_summary(current_user))}, private=True)
+
+@blueprint.route('/vendor/orders/complete', methods=['POST'])
+def vendor_complete():
+    signed_in('Vendor')
+    ids = json_body().get('ids')
+    if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+        raise ApiError(400, '"ids" must be a list of order ids.')
+    return respond({'completed': Order.complete(current_user, ids)})
+
+app.register_blueprint(blueprint)
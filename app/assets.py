@@ -0,0 +1,133 @@
+'''
+Fingerprinted static assets. `flask assets build` copies each static file to
+static/build under a name containing its content hash, alongside gzip and brotli
+versions, and writes a manifest. While that manifest exists url_for('static', ...)
+points at the fingerprinted copies, and they are served precompressed and cached for
+a year, since a changed file gets a new name.
+'''
+
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+from app import app
+
+BUILD = os.path.join(app.static_folder, 'build')
+MANIFEST = os.path.join(BUILD, 'manifest.json')
+
+#source maps and archives aren't served to browsers; photos in the store already have
+#content-hash names
+SKIP_EXTENSIONS = ('.map', '.zip')
+SKIP_FOLDERS = ('build', os.path.join('img', 'store'))
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+YEAR = 365 * 24 * 60 * 60
+
+def load_manifest():
+    if not os.path.exists(MANIFEST):
+        return {}
+    with open(MANIFEST) as f:
+        return json.load(f)
+
+manifest = load_manifest()
+
+def fingerprint(name, data):
+    root, extension = os.path.splitext(name)
+    return '{}.{}{}'.format(root, hashlib.sha256(data).hexdigest()[:12], extension)
+
+def compress_gzip(data):
+    #a fixed mtime keeps the output identical between builds
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+def compress_brotli(data):
+    import brotli
+    return brotli.compress(data, quality=11)
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build(report=None):
+    '''
+    Fingerprint and precompress every static file into static/build and write the
+    manifest. Calls >report(name, built name, sizes)< for each file, where sizes maps
+    '', 'gz' and 'br' to the bytes written. Returns the new manifest.
+    '''
+
+    built = {}
+    for folder, subfolders, files in os.walk(app.static_folder):
+        relative = os.path.relpath(folder, app.static_folder)
+        if relative.startswith(SKIP_FOLDERS):
+            subfolders[:] = []
+            continue
+        for filename in files:
+            if filename.endswith(SKIP_EXTENSIONS):
+                continue
+            name = os.path.normpath(os.path.join(relative, filename)).replace(os.sep, '/')
+            with open(os.path.join(folder, filename), 'rb') as f:
+                data = f.read()
+
+            target = fingerprint(name, data)
+            write(os.path.join(BUILD, target), data)
+            sizes = {'': len(data)}
+            #keep a compressed copy only when it actually saves bytes
+            if filename.endswith(COMPRESSIBLE):
+                for suffix, compress in (('gz', compress_gzip), ('br', compress_brotli)):
+                    compressed = compress(data)
+                    if len(compressed) < len(data):
+                        write(os.path.join(BUILD, target + '.' + suffix), compressed)
+                        sizes[suffix] = len(compressed)
+            built[name] = target
+            if report:
+                report(name, target, sizes)
+
+    write(MANIFEST, json.dumps(built, indent=2, sort_keys=True).encode())
+    manifest.clear()
+    manifest.update(built)
+    return built
+
+@app.url_defaults
+def fingerprinted_url(endpoint, values):
+    if endpoint == 'static' and manifest:
+        target = manifest.get(values.get('filename'))
+        if target:
+            values['filename'] = 'build/' + target
+
+def send_immutable(path, filename, encoding=None):
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+        cache_timeout=YEAR)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(YEAR)
+    return response
+
+def serve_static(filename):
+    '''
+    Replaces Flask's static view. Fingerprinted files go out precompressed when the
+    browser accepts it, and they and stored photos are marked immutable. Anything
+    else is served as before.
+    '''
+
+    if not filename.startswith(('build/', 'img/store/')):
+        return app.send_static_file(filename)
+    path = safe_join(app.static_folder, filename)
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(path + suffix):
+            response = send_immutable(path + suffix, filename, encoding)
+            break
+    else:
+        response = send_immutable(path, filename)
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = serve_static
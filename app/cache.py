@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache(object):
+    '''
+    Small thread-safe in-process cache. Holds at most >maxsize< entries, evicting the least
+    recently used one when full, and treats entries older than >ttl< seconds as missing.
+    Every delete, invalidate or clear moves the cache to a new generation; see set().
+    '''
+
+    def __init__(self, maxsize=512, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None, generation=None):
+        '''
+        Store >value< under >key<. Pass the generation read before computing >value< as
+        >generation<, and the value is dropped if anything was invalidated meanwhile, since
+        it may have been computed from the data that invalidation was for.
+        '''
+
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def invalidate(self, predicate):
+        '''
+        Drop every entry whose key satisfies >predicate<.
+        '''
+
+        with self.lock:
+            self.generation += 1
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
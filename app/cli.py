@@ -0,0 +1,101 @@
+import os
+import time
+import click
+from app import app, db
+from app.models import SearchableMixin, Item
+from app import images
+from app.assets import build
+from app.indexaudit import FULL_SCAN, load_shapes, audit_indexes
+
+#flask search ... commands
+@app.cli.group()
+def search():
+    '''Search index maintenance commands.'''
+    pass
+
+@search.command()
+@click.option('--workers', default=4, help='Number of threads sending _bulk requests.')
+@click.option('--batch-size', default=1000, help='Rows read and documents sent per batch.')
+@click.argument('indexes', nargs=-1)
+def reindex(workers, batch_size, indexes):
+    '''Rebuild search indexes (all of them if none are named) without downtime.'''
+    if not app.search_backend.enabled:
+        raise click.ClickException('No search backend is configured.')
+
+    models = [model for model in SearchableMixin.__subclasses__() 
+        if not indexes or model.__tablename__ in indexes]
+    for model in models:
+        start = time.time()
+
+        def report(sent, failed):
+            elapsed = max(time.time() - start, 1e-6)
+            click.echo('{}: {} documents, {} failed, {:.0f} docs/s'.format(
+                model.__tablename__, sent, failed, sent / elapsed))
+
+        target = model.reindex(workers=workers, batch_size=batch_size, report=report)
+        click.echo('{}: now searching {} ({:.1f}s)'.format(
+            model.__tablename__, target, time.time() - start))
+
+#flask audit-indexes (Flask-Migrate's db group is resolved before the app loads, so it
+#can't take commands from here)
+@app.cli.command('audit-indexes')
+@click.argument('log', required=False)
+def audit(log):
+    '''Report filters in a QUERY_LOG that have no supporting index.'''
+    log = log or app.config['QUERY_LOG']
+    if not log:
+        raise click.ClickException('Record a run with QUERY_LOG=<file> first, or name the file.')
+    statements = load_shapes(log)
+    missing = audit_indexes(statements)
+    for (table, column), found in sorted(missing.items()):
+        click.echo('{}.{}: no index, filtered by {} statement{}, e.g.\n    {}'.format(
+            table, column, len(found), '' if len(found) == 1 else 's',
+            ' '.join(found[0].split())))
+    click.echo('{} statements checked, {} marked as full scans, {} unindexed column{}.'.format(
+        len(statements), sum(FULL_SCAN in statement for statement in statements),
+        len(missing), '' if len(missing) == 1 else 's'))
+    if missing:
+        raise SystemExit(1)
+
+#flask images ... commands
+@app.cli.group('images')
+def images_group():
+    '''Item photo commands.'''
+    pass
+
+@images_group.command()
+def backfill():
+    '''Copy photos uploaded before the image pipeline into the store and resize them.'''
+    copied = 0
+    for item in Item.query.filter(Item.image_key == None, Item.image != None):
+        path = os.path.join(app.config['UPLOADED_PHOTOS_DEST'], item.image)
+        if not os.path.exists(path):
+            click.echo('{}: {} is missing'.format(item.id, item.image))
+            continue
+        with open(path, 'rb') as f:
+            key, name = images.store(f.read(), item.image)
+        item.image = images.photo_name(name)
+        db.session.commit()
+        images.process(item, key, name)
+        copied += 1
+    images.pool.shutdown(wait=True)
+    click.echo('{} photos copied into the store and resized.'.format(copied))
+
+#flask assets ... commands
+@app.cli.group()
+def assets():
+    '''Static asset commands.'''
+    pass
+
+@assets.command('build')
+def build_assets():
+    '''Fingerprint and precompress static files and write the manifest.'''
+    totals = {'': 0, 'gz': 0, 'br': 0}
+
+    def report(name, target, sizes):
+        for suffix in totals:
+            totals[suffix] += sizes.get(suffix, sizes[''])
+
+    built = build(report)
+    click.echo('{} files, {} bytes ({} gzip, {} brotli).'.format(
+        len(built), totals[''], totals['gz'], totals['br']))
@@ -0,0 +1,52 @@
+'''
+Act on changes once the transaction that made them commits. Mapper events fire at flush
+time, so dropping a cache there would let another request cache the old rows again before
+the commit lands, and a rollback would leave nothing to drop. Instead the events mark
+session.info under a name, and the callback registered for that name runs after commit.
+'''
+
+from app import db
+
+#the mapper events for every kind of row change
+CHANGES = ('after_insert', 'after_update', 'after_delete')
+
+def mark_changed(session, name, value=True):
+    '''
+    Add >value< to the set marked under >name< for >session<'s transaction. Code that
+    changes rows with Core statements, which skip mapper events, calls this itself.
+    '''
+
+    if session is not None:
+        session.info.setdefault(name, set()).add(value)
+
+def watch(name, models, changed=None, events=CHANGES):
+    '''
+    Mark under >name< whenever a row of one of >models< fires one of >events<. The value
+    marked is >changed<(row), or True without it; a value of None marks nothing.
+    '''
+
+    def mark(mapper, connection, target):
+        value = changed(target) if changed else True
+        if value is not None:
+            mark_changed(db.object_session(target), name, value)
+
+    for model in models:
+        for event in events:
+            db.event.listen(model, event, mark)
+
+def on_commit(name, callback):
+    '''
+    Call >callback< with the set of values marked under >name< when a transaction that
+    marked any commits; a rollback forgets them. Each name belongs to one callback.
+    '''
+
+    def after_commit(session):
+        changed = session.info.pop(name, None)
+        if changed:
+            callback(changed)
+
+    def after_rollback(session):
+        session.info.pop(name, None)
+
+    db.event.listen(db.session, 'after_commit', after_commit)
+    db.event.listen(db.session, 'after_rollback', after_rollback)
@@ -0,0 +1,98 @@
+'''
+Database engine profile. Server databases get the pool settings from config, SQLite gets
+WAL and the other pragmas on every new connection, and reads made while serving a GET
+request can be sent to a read replica (DATABASE_REPLICA_URL).
+'''
+
+from functools import wraps
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.expression import Select
+
+POOL_OPTIONS = {'pool_size': 'DATABASE_POOL_SIZE', 'max_overflow': 'DATABASE_MAX_OVERFLOW',
+    'pool_timeout': 'DATABASE_POOL_TIMEOUT', 'pool_recycle': 'DATABASE_POOL_RECYCLE',
+    'pool_pre_ping': 'DATABASE_POOL_PRE_PING'}
+
+def replica_binds(config):
+    '''
+    SQLALCHEMY_BINDS for >config<: the replica, if there is one.
+    '''
+
+    if config['DATABASE_REPLICA_URL']:
+        return {'replica': config['DATABASE_REPLICA_URL']}
+    return None
+
+def sqlite_pragmas(config):
+    '''
+    The PRAGMA statements run on each new SQLite connection.
+    '''
+
+    pragmas = ['PRAGMA busy_timeout = {:d}'.format(config['SQLITE_BUSY_TIMEOUT']),
+        'PRAGMA synchronous = {}'.format(config['SQLITE_SYNCHRONOUS']),
+        'PRAGMA mmap_size = {:d}'.format(config['SQLITE_MMAP_SIZE'])]
+    #WAL lets readers carry on while a write commits, and is kept in the database file
+    if config['SQLITE_WAL']:
+        pragmas.insert(0, 'PRAGMA journal_mode = WAL')
+    return pragmas
+
+def read_from_primary(view):
+    '''
+    Keep every read in >view< on the primary database, for GET views that write and
+    can't act on a replica's slightly stale rows.
+    '''
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_primary = True
+        return view(*args, **kwargs)
+    return wrapper
+
+class RoutingSession(SignallingSession):
+    '''
+    Sends SELECTs to the replica while serving a GET request. Everything else goes to the
+    primary, and so does every read in a request once it has pending changes or has
+    written anything, so a view never works out a write from a replica's stale rows.
+    '''
+
+    def __init__(self, db, **options):
+        self.db = db
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        binds = self.app.config['SQLALCHEMY_BINDS'] or {}
+        if 'replica' in binds and has_request_context() and request.method in ('GET', 'HEAD'):
+            if self._flushing or isinstance(clause, UpdateBase) or not self._is_clean():
+                g.read_primary = True
+            elif isinstance(clause, Select) and not g.get('read_primary'):
+                return self.db.get_engine(self.app, bind='replica')
+        return SignallingSession.get_bind(self, mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''
+    Flask-SQLAlchemy with the engine profile above applied to each engine it creates.
+    '''
+
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        config = self.get_app().config
+        if sa_url.get_backend_name() == 'sqlite':
+            engine = create_engine(sa_url, **engine_opts)
+            pragmas = sqlite_pragmas(config)
+
+            @event.listens_for(engine, 'connect')
+            def configure(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+                cursor.close()
+
+            return engine
+
+        for option, key in POOL_OPTIONS.items():
+            engine_opts.setdefault(option, config[key])
+        return create_engine(sa_url, **engine_opts)
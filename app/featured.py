@@ -0,0 +1,57 @@
+from flask import render_template
+from markupsafe import Markup
+from app import app, db
+from app.cache import TTLCache
+from app.commits import mark_changed, on_commit
+from app.models import Item
+
+#rendered product cards for the front page; a single entry, so invalidation is just clear()
+card_cache = TTLCache(1, app.config['FEATURED_CACHE_TTL'])
+
+#columns that show up on a product card
+CARD_FIELDS = ('title', 'description', 'price', 'featured')
+
+def featured_cards():
+    '''
+    Returns the rendered _featured_display.html card for each featured Item, at most
+    FEATURED_ITEMS of them. While the cache is warm this touches neither the database
+    nor Jinja. Each worker process keeps its own copy, so a change made through another
+    worker shows up here after FEATURED_CACHE_TTL seconds at most.
+    '''
+
+    cards = card_cache.get('featured')
+    if cards is None:
+        generation = card_cache.generation
+        items = Item.query.filter_by(featured=True).order_by(Item.id).limit(
+            app.config['FEATURED_ITEMS']).all()
+        cards = [Markup(render_template('cards/_featured_display.html', product=item))
+            for item in items]
+        card_cache.set('featured', cards, generation=generation)
+    return cards
+
+def invalidate_featured():
+    card_cache.clear()
+
+#mark the session when a write could change what the cards show, and drop the cards once
+#that write is committed. Cards rendered from the old rows while the commit lands aren't
+#stored, because the drop moves card_cache to a new generation
+def mark_session(target, changed):
+    if changed:
+        mark_changed(db.object_session(target), 'featured_changed')
+
+@db.event.listens_for(Item, 'after_insert')
+def item_inserted(mapper, connection, target):
+    mark_session(target, target.featured)
+
+@db.event.listens_for(Item, 'after_delete')
+def item_deleted(mapper, connection, target):
+    mark_session(target, target.featured)
+
+@db.event.listens_for(Item, 'after_update')
+def item_updated(mapper, connection, target):
+    state = db.inspect(target)
+    was_featured = state.attrs.featured.history.deleted
+    mark_session(target, (target.featured or any(was_featured)) and 
+        any(state.attrs[field].history.has_changes() for field in CARD_FIELDS))
+
+on_commit('featured_changed', lambda changed: invalidate_featured())
@@ -70,6 +70,10 @@ class CartQuantitiesForm(FlaskForm):
     quantities = FieldList(FormField(QuantityEntryForm), min_entries=1)
     submit = SubmitField('Done')
 
+#the checked orders come in as a list of 'order' ids
+class CompleteOrdersForm(FlaskForm):
+    submit = SubmitField('Mark Complete')
+
 
 #elasticsearch form
 class SearchForm(FlaskForm):
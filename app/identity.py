@@ -0,0 +1,64 @@
+from app import app, login
+from app.cache import TTLCache
+from app.commits import watch, on_commit
+from app.models import User, Cart
+
+#signed in users' snapshots by id; each worker keeps its own, so a change made through
+#another worker shows up here after USER_CACHE_TTL seconds at most
+user_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+class UserSnapshot(object):
+    '''
+    The User fields a request needs, kept between requests so a signed in page view
+    doesn't load the User or look up their Cart. This is what current_user is, except
+    on the request that logs in.
+    '''
+
+    __slots__ = ('id', 'username', 'usertype', 'firstname', 'cartid')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.usertype = user.usertype
+        self.firstname = user.firstname
+        cart = user.cart
+        self.cartid = cart.id if cart else None
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def cart(self):
+        '''
+        This user's Cart, loaded by its primary key.
+        '''
+
+        return Cart.query.get(self.cartid) if self.cartid else None
+
+    def __repr__(self):
+        return '<UserSnapshot {}>'.format(self.username)
+
+@login.user_loader
+def load_user(id):
+    snapshot = user_cache.get(int(id))
+    if snapshot is None:
+        generation = user_cache.generation
+        user = User.query.get(int(id))
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user)
+        user_cache.set(user.id, snapshot, generation=generation)
+    return snapshot
+
+def forget_users(userids):
+    for userid in userids:
+        user_cache.delete(userid)
+
+#forget a user's snapshot once a change to them, or to which cart is theirs, is committed
+watch('users_changed', (User,), lambda user: user.id)
+watch('users_changed', (Cart,), lambda cart: cart.customerid, ('after_insert', 'after_delete'))
+on_commit('users_changed', forget_users)
@@ -0,0 +1,125 @@
+'''
+Image pipeline for item photos. Uploads are stored by the SHA-256 of their contents, so the
+same photo uploaded twice is kept once, and resized WebP and JPEG copies of each are made
+on a small thread pool. Once they exist the Item's image_key is set and pages can use the
+srcset() and image_url() template helpers instead of the full-size original.
+'''
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import url_for
+from app import app, db
+from app.models import Item
+
+#derivative name -> width in pixels (images are never scaled up)
+SIZES = {'thumb': 160, 'card': 480, 'full': 1200}
+FORMATS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+#served as static files, under a two-character prefix so no folder gets too big
+STORE = os.path.join(app.static_folder, 'img', 'store')
+
+pool = ThreadPoolExecutor(app.config['IMAGE_WORKERS'])
+
+def store_path(name):
+    return os.path.join(STORE, name[:2], name)
+
+def derivative_name(key, size, format):
+    return '{}-{}.{}'.format(key, size, FORMATS[format])
+
+def derivatives_exist(key):
+    return all(os.path.exists(store_path(derivative_name(key, size, format)))
+        for size in SIZES for format in FORMATS)
+
+def render(source, target, width, format):
+    '''
+    Write >source< to >target< as >format<, at most >width< pixels wide.
+    '''
+
+    from wand.image import Image
+
+    with Image(filename=source) as image:
+        image.auto_orient()
+        if image.width > width:
+            image.transform(resize='{}x'.format(width))
+        image.strip()
+        image.format = format
+        image.compression_quality = app.config['IMAGE_QUALITY']
+        #write beside the target and rename, so a half-written file is never served
+        root, extension = os.path.splitext(target)
+        partial = root + '.part' + extension
+        image.save(filename=partial)
+    os.replace(partial, target)
+
+def make_derivatives(itemid, key, source):
+    '''
+    Render every size and format of >source<, then point Item >itemid< at them.
+    '''
+
+    try:
+        for size, width in SIZES.items():
+            for format in FORMATS:
+                target = store_path(derivative_name(key, size, format))
+                if not os.path.exists(target):
+                    render(source, target, width, format)
+    except Exception:
+        app.logger.exception('Could not resize image %s', key)
+        return
+
+    with app.app_context():
+        item = Item.query.get(itemid)
+        if item:
+            item.image_key = key
+            db.session.commit()
+
+def store(data, filename):
+    '''
+    Save the bytes >data< of image >filename< under their content hash unless an
+    identical file is already stored. Returns (key, file name of the stored original).
+    '''
+
+    key = hashlib.sha256(data).hexdigest()
+    name = key + (os.path.splitext(filename)[1].lower() or '.jpg')
+    path = store_path(name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+    return key, name
+
+def store_upload(upload):
+    return store(upload.read(), upload.filename)
+
+def photo_name(name):
+    '''
+    Stored file >name< as a path under the photos upload folder, for Item.image.
+    '''
+
+    return 'store/{}/{}'.format(name[:2], name)
+
+def process(item, key, name):
+    '''
+    Give >item< the derivatives of the stored original >name<: straight away if an
+    earlier upload of the same photo made them, otherwise in the background.
+    '''
+
+    if derivatives_exist(key):
+        item.image_key = key
+        db.session.commit()
+    else:
+        pool.submit(make_derivatives, item.id, key, store_path(name))
+
+def image_url(key, size='full', format='jpeg'):
+    return url_for('static', filename='img/' + photo_name(derivative_name(key, size, format)))
+
+def srcset(key, format='jpeg'):
+    '''
+    The srcset attribute value listing every size of image >key<.
+    '''
+
+    return ', '.join('{} {}w'.format(image_url(key, size, format), width)
+        for size, width in sorted(SIZES.items(), key=lambda pair: pair[1]))
+
+app.add_template_global(image_url)
+app.add_template_global(srcset)
@@ -0,0 +1,91 @@
+'''
+Index audit. While QUERY_LOG is set every distinct SQL statement is recorded and saved
+there at exit; `flask audit-indexes` then checks each column those statements filter or
+join on against the indexes in the database. Statements that are meant to read a whole
+table are marked with FULL_SCAN and left out.
+'''
+
+import atexit
+import json
+import os
+import re
+from sqlalchemy.engine import Engine
+from app import app, db
+
+#every distinct statement sent while QUERY_LOG is set, written there at exit for
+#flask audit-indexes
+query_shapes = set()
+
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if app.config['QUERY_LOG']:
+        query_shapes.add(statement)
+
+def load_shapes(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f))
+
+@atexit.register
+def save_shapes():
+    #merge with what earlier runs saw, so several test runs add up
+    if app.config['QUERY_LOG'] and query_shapes:
+        shapes = load_shapes(app.config['QUERY_LOG']) | query_shapes
+        with open(app.config['QUERY_LOG'], 'w') as f:
+            json.dump(sorted(shapes), f, indent=0)
+
+#put this in a statement that reads every row on purpose, with .prefix_with(FULL_SCAN),
+#so the audit doesn't report it
+FULL_SCAN = '/* full scan */'
+
+NAME = r'"?(\w+)"?'
+ALIAS = re.compile(r'\b{} AS {}'.format(NAME, NAME))
+COMPARISON = re.compile(r'{0}\.{0}\s*(?:=|!=|<>|<=|>=|<|>|\bIN\b|\bIS\b|\bLIKE\b)\s*(?:{0}\.{0})?'.format(NAME))
+
+def filtered_columns(statement):
+    '''
+    The (table, column) pairs >statement< filters or joins on, as a list of groups: a
+    join condition between two columns is one group, since an index on either side will do.
+    Aliases like item_1 are resolved back to their table.
+    '''
+
+    aliases = dict((alias, table) for table, alias in ALIAS.findall(statement))
+    groups = []
+    for table, column, other_table, other_column in COMPARISON.findall(statement):
+        group = [(aliases.get(table, table), column)]
+        if other_table:
+            group.append((aliases.get(other_table, other_table), other_column))
+        groups.append(group)
+    return groups
+
+def audit_indexes(statements):
+    '''
+    Returns {(table, column): [statements]} for every filter in >statements< that isn't
+    the leading column of an index (or the primary key) on its table. A filter is let off
+    when the same statement also filters its table on an indexed column, and statements
+    marked with FULL_SCAN aren't checked.
+    '''
+
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    leading = set()
+    for table in tables:
+        leading.update((table, column) for column in
+            inspector.get_pk_constraint(table)['constrained_columns'][:1])
+        for index in inspector.get_indexes(table) + inspector.get_unique_constraints(table):
+            leading.add((table, index['column_names'][0]))
+
+    missing = {}
+    for statement in statements:
+        if FULL_SCAN in statement:
+            continue
+        groups = [[pair for pair in group if pair[0] in tables]
+            for group in filtered_columns(statement)]
+        covered = set(group[0][0] for group in groups if len(group) == 1 and group[0] in leading)
+        for group in groups:
+            if group and not any(pair in leading for pair in group) and \
+                    not (len(group) == 1 and group[0][0] in covered):
+                for pair in group:
+                    missing.setdefault(pair, []).append(statement)
+    return missing
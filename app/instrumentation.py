@@ -0,0 +1,131 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request, request_started, request_finished, \
+    before_render_template, template_rendered
+from sqlalchemy.engine import Engine
+from app import app, db
+
+#per-endpoint totals, in the order they're exported
+FIELDS = (
+    ('requests', 'counter', 'Requests handled.'),
+    ('request_seconds', 'counter', 'Wall time spent handling requests.'),
+    ('sql_queries', 'counter', 'SQL statements executed.'),
+    ('sql_seconds', 'counter', 'Time spent waiting on SQL statements.'),
+    ('template_seconds', 'counter', 'Time spent rendering templates.'),
+    ('search_seconds', 'counter', 'Time spent waiting on the search backend.'),
+)
+
+class Metrics(object):
+    '''
+    Thread-safe per-endpoint totals of FIELDS, exported in the Prometheus text format.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def add(self, endpoint, sample):
+        with self.lock:
+            totals = self.endpoints.setdefault(endpoint, dict((name, 0) for name, _, _ in FIELDS))
+            for name, _, _ in FIELDS:
+                totals[name] += sample.get(name, 0)
+
+    def render(self):
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = []
+            for name, kind, description in FIELDS:
+                metric = 'sellout_{}_total'.format(name)
+                lines.append('# HELP {} {}'.format(metric, description))
+                lines.append('# TYPE {} {}'.format(metric, kind))
+                for endpoint, totals in endpoints:
+                    lines.append('{}{{endpoint="{}"}} {}'.format(metric, endpoint, totals[name]))
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def current_sample():
+    return g.get('instrumentation') if has_request_context() else None
+
+@contextmanager
+def timed(field):
+    '''
+    Add the time spent in the block to the current request's >field< (e.g. search_seconds).
+    '''
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        sample = current_sample()
+        if sample is not None:
+            sample[field] += time.time() - start
+
+#SQL: time every statement, and keep the statements themselves when the slow log is on.
+#The start time lives on the statement's execution context, so a statement that fails and
+#never reaches after_cursor_execute leaves nothing behind on the connection. The dialect's
+#own probes on first connect have no context and aren't timed
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.instrumentation_start = time.time()
+
+@db.event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'instrumentation_start', None)
+    if start is None:
+        return
+    elapsed = time.time() - start
+    sample = current_sample()
+    if sample is not None:
+        sample['sql_queries'] += 1
+        sample['sql_seconds'] += elapsed
+        if sample['statements'] is not None:
+            sample['statements'].append((elapsed, statement))
+
+#requests and templates, through Flask's signals
+def started(sender, **extra):
+    g.instrumentation = {
+        'start': time.time(),
+        'requests': 1,
+        'sql_queries': 0,
+        'sql_seconds': 0.0,
+        'template_seconds': 0.0,
+        'search_seconds': 0.0,
+        'renders': [],
+        'statements': [] if app.config['SLOW_REQUEST_SECONDS'] else None,
+    }
+
+def finished(sender, response, **extra):
+    sample = current_sample()
+    if sample is None:
+        return
+    g.instrumentation = None
+    sample['request_seconds'] = time.time() - sample['start']
+    endpoint = request.endpoint or 'unmatched'
+    metrics.add(endpoint, sample)
+
+    threshold = app.config['SLOW_REQUEST_SECONDS']
+    if threshold and sample['request_seconds'] >= threshold:
+        app.logger.warning('Slow request: %s %s (%s) took %.3fs; %d queries in %.3fs, '
+            'templates %.3fs, search %.3fs\n%s', request.method, request.full_path, endpoint,
+            sample['request_seconds'], sample['sql_queries'], sample['sql_seconds'],
+            sample['template_seconds'], sample['search_seconds'],
+            '\n'.join('  {:.4f}s {}'.format(elapsed, statement) 
+                for elapsed, statement in sample['statements']))
+
+def rendering(sender, template, context, **extra):
+    sample = current_sample()
+    if sample is not None:
+        sample['renders'].append(time.time())
+
+def rendered(sender, template, context, **extra):
+    sample = current_sample()
+    if sample is not None and sample['renders']:
+        sample['template_seconds'] += time.time() - sample['renders'].pop()
+
+request_started.connect(started, app)
+request_finished.connect(finished, app)
+before_render_template.connect(rendering, app)
+template_rendered.connect(rendered, app)
@@ -1,60 +1,134 @@
-from app import db, login
-from app.search import add_to_index, remove_from_index, query_index
-from werkzeug.security import generate_password_hash, check_password_hash
+import sqlite3
+from sqlalchemy.dialects import postgresql
+from app import app, db
+from app.search import query_index, rebuild_index, payload_for
+from app.instrumentation import timed
+from app.commits import mark_changed
+from app.indexaudit import FULL_SCAN
+from app.passwords import HashingBusy, hash_password, verify_password, needs_rehash
 from flask_login import UserMixin
 
-#this is a mixin class that gives searchability with Elasticsearch
+#this is a mixin class that gives searchability with the configured search backend
 class SearchableMixin(object):
     '''
     When SearchableMixin is included for inheritance on another object, it is given 
-    searchability in the Elasticsearch cluster. .reindex() must be called to initialize
-    searchability on objects that are retroactively given SearchableMixin.
+    searchability in the search backend (the Elasticsearch cluster by default).
+    .reindex() must be called to initialize searchability on objects that are
+    retroactively given SearchableMixin.
     '''
     
     @classmethod
-    def search(cls, expression, page, per_page):
-        ids, total = query_index(cls.__tablename__, expression, page, per_page)
+    def search(cls, expression, page, per_page, after=None):
+        '''
+        Returns (list of matching objects in relevance order, total number of hits, cursor
+        for the next page). Pass that cursor back as >after< to fetch the next page cheaply.
+        Relationships named in __searchload__ are eager-loaded for the results page.
+        '''
+
+        query = cls.query
+        for relationship in getattr(cls, '__searchload__', ()):
+            query = query.options(db.joinedload(relationship))
+
+        #SQLite FTS5 ranks and loads the rows in one statement
+        if app.search_backend.joins_in_sql:
+            with timed('search_seconds'):
+                return app.search_backend.search_models(query, cls.id, cls.__tablename__, 
+                    expression, page, per_page, after)
+
+        ids, total, cursor = query_index(cls.__tablename__, expression, page, per_page, after)
         if total == 0 or not len(ids):
-            return cls.query.filter_by(id=0), 0
-        
-        when = []
-        for i in range(len(ids)):
-            when.append((ids[i], i))
-        
-        #return cls.query.filter(cls.id.in_(ids)).order_by(db.case(when, value=cls.id)), total
-        return cls.query.filter(cls.id.in_(ids)).order_by(
-            db.case(when, value=cls.id)), total
+            return [], 0, None
+
+        #fetch the hits with one IN query and put them back in the backend's order in Python
+        query = query.filter(cls.id.in_(ids))
+        found = dict((obj.id, obj) for obj in query)
+        return [found[id] for id in ids if id in found], total, cursor
+
+    #how many index operations were sent to the indexer, and how many dirty objects were
+    #skipped because none of their __searchable__ columns changed
+    index_counts = {'sent': 0, 'skipped': 0}
+
+    @staticmethod
+    def searchable_changed(obj):
+        '''
+        True if any column listed in >obj<.__searchable__ has pending changes.
+        '''
+
+        attrs = db.inspect(obj).attrs
+        return any(attrs[field].history.has_changes() for field in obj.__searchable__)
 
     @classmethod
-    def before_commit(cls, session):
-        #figure out what the current db.session's state is
-        session._changes = {
-            'add': list(session.new),
-            'update': list(session.dirty),
-            'delete': list(session.deleted)
-        }
-    
-    @classmethod
-    def after_commit(cls, session):
-        for obj in session._changes['add']:
+    def before_flush(cls, session, flush_context, instances):
+        #record changes at every flush, since attribute history is reset once a flush
+        #(including an autoflush before a query) writes them out
+        changes = getattr(session, '_changes', None) or {
+            'add': set(), 'update': set(), 'delete': set(), 'seen': set()}
+        for obj in session.new:
             if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
-        for obj in session._changes['update']:
+                changes['add'].add(obj)
+        for obj in session.dirty:
             if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
-        for obj in session._changes['delete']:
+                changes['seen'].add(obj)
+                if cls.searchable_changed(obj):
+                    changes['update'].add(obj)
+        for obj in session.deleted:
             if isinstance(obj, SearchableMixin):
-                remove_from_index(obj.__tablename__, obj)
-        
+                changes['delete'].add(obj)
+        session._changes = changes
+
+    @classmethod
+    def after_rollback(cls, session):
         session._changes = None
+    
+    @classmethod
+    def after_commit(cls, session):
+        changes = getattr(session, '_changes', None)
+        session._changes = None
+        if not changes:
+            return
+        cls.index_counts['skipped'] += len(
+            changes['seen'] - changes['add'] - changes['update'] - changes['delete'])
+
+        #hand the changes to the search backend; Elasticsearch sends them from a background queue
+        if not app.search_backend.enabled or not app.search_backend.needs_changes:
+            return
+        for obj in (changes['add'] | changes['update']) - changes['delete']:
+            app.search_backend.enqueue(obj.__tablename__, obj.id, 'index', payload_for(obj))
+            cls.index_counts['sent'] += 1
+        for obj in changes['delete']:
+            app.search_backend.enqueue(obj.__tablename__, obj.id, 'delete')
+            cls.index_counts['sent'] += 1
 
     @classmethod
-    def reindex(cls):
-        for obj in cls.query:
-            add_to_index(obj.__tablename__, obj)
+    def searchable_batches(cls, batch_size):
+        '''
+        Stream (id, payload) pairs in batches of >batch_size<, paging on the primary key
+        and selecting only the __searchable__ columns.
+        '''
+
+        columns = [getattr(cls, field) for field in cls.__searchable__]
+        last = 0
+        while True:
+            rows = db.session.query(cls.id, *columns).filter(cls.id > last).order_by(
+                cls.id).limit(batch_size).all()
+            if not rows:
+                return
+            yield [(row[0], dict(zip(cls.__searchable__, row[1:]))) for row in rows]
+            last = rows[-1][0]
+
+    @classmethod
+    def reindex(cls, workers=4, batch_size=1000, report=None):
+        '''
+        Rebuild this class's index from the database without search downtime.
+        See app.search.rebuild_index for >workers< and >report<.
+        '''
 
-#listen to SQLAlchemy commits so the elasticsearch indices are always updated on database changes
-db.event.listen(db.session, 'before_commit', SearchableMixin.before_commit)
+        return rebuild_index(cls.__tablename__, cls.searchable_batches(batch_size), 
+            workers=workers, report=report)
+
+#listen to SQLAlchemy flushes and commits so the search indices are always updated on database changes
+db.event.listen(db.session, 'before_flush', SearchableMixin.before_flush)
+db.event.listen(db.session, 'after_rollback', SearchableMixin.after_rollback)
 db.event.listen(db.session, 'after_commit', SearchableMixin.after_commit)
 
 class User(UserMixin, db.Model):
@@ -81,10 +155,56 @@ class User(UserMixin, db.Model):
         db.session.commit()
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        '''
+        True if >password< is right. A hash made with older PASSWORD_HASH_METHOD or
+        PASSWORD_SALT_LENGTH settings is replaced with a current one on the way.
+        '''
+
+        if not self.password_hash or not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            #the password was right either way; a busy pool just postpones the upgrade
+            try:
+                self.password_hash = hash_password(password)
+                db.session.commit()
+            except HashingBusy:
+                app.logger.warning('Hashing busy, password upgrade for %s postponed',
+                    self.username)
+        return True
+
+    #the columns shown on the admin user list and its CSV export
+    listing_columns = ('id', 'username', 'email', 'usertype')
+
+    @classmethod
+    def listing(cls, after=0, usertype=None, limit=None):
+        '''
+        Rows of just the listing_columns for users with an id past >after<, in id order.
+        Pass the last id of one page as >after< to get the next, without an OFFSET scan.
+        '''
+
+        query = db.session.query(*[getattr(cls, column) for column in cls.listing_columns])
+        query = query.filter(cls.id > after)
+        if usertype:
+            query = query.filter(cls.usertype == usertype)
+        return query.order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def listing_batches(cls, usertype=None, batch_size=1000):
+        '''
+        Yields every listing row in id order, fetching >batch_size< rows at a time.
+        '''
+
+        after = 0
+        while True:
+            rows = cls.listing(after, usertype, batch_size)
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after = rows[-1].id
 
     def __repr__(self):
         return '<User {}: {} {}>'.format(self.username, self.firstname, self.lastname)   
@@ -95,14 +215,16 @@ class Item(SearchableMixin, db.Model):
     '''
 
     __searchable__ = ['title', 'description']
+    __searchload__ = ['vendor']
     id          = db.Column(db.Integer, primary_key=True)
     title       = db.Column(db.String(64))
     description = db.Column(db.String(300))
     price       = db.Column(db.Float)
     stock       = db.Column(db.Integer)
-    featured    = db.Column(db.Boolean)
-    image       = db.Column(db.String(64))
-    vendorid    = db.Column(db.Integer, db.ForeignKey('user.id'))
+    featured    = db.Column(db.Boolean, index=True)
+    image       = db.Column(db.String(128))
+    image_key   = db.Column(db.String(64))
+    vendorid    = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     cartitem    = db.relationship('CartItem', backref='item', lazy='dynamic')
     order       = db.relationship('Order', backref='item', lazy='dynamic')
     tags        = db.relationship('ItemTag', backref='item', lazy='dynamic')
@@ -112,8 +234,16 @@ class Item(SearchableMixin, db.Model):
         db.session.commit()
         return self.featured
 
+    @classmethod
+    def for_product_page(cls, pid):
+        '''
+        Load Item >pid< together with its vendor in one query.
+        '''
+
+        return cls.query.options(db.joinedload(cls.vendor)).filter_by(id=pid).first()
+
     def __repr__(self):
-        return '<Item {} sold by {}>'.format(self.title, User.query.get(self.vendorid).username)
+        return '<Item {} sold by {}>'.format(self.title, self.vendor.username if self.vendor else None)
 
 #cart system models
 class Cart(db.Model):
@@ -123,24 +253,30 @@ class Cart(db.Model):
     '''
 
     id          = db.Column(db.Integer, primary_key=True)
-    customerid  = db.Column(db.Integer, db.ForeignKey('user.id'))
+    customerid  = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     customer    = db.relationship('User', back_populates='cart')
     cartprice   = db.Column(db.Float)
     items       = db.relationship('CartItem', backref='cart', lazy='dynamic')
 
-    def add_item(self, item):
+    def lines(self):
         '''
-        Add Item >item< to cart. 
+        This cart's CartItems with their Items, loaded in one query.
+        '''
+
+        return self.items.options(db.joinedload(CartItem.item)).all()
+
+    def add_item(self, item, quantity=1):
+        '''
+        Add >quantity< of Item >item< to cart. Returns the new total price of its line.
+        The line is written with one atomic upsert (see CartItem.add), so double clicks and
+        concurrent tabs can't create duplicate lines or lose an increment.
         '''
-        
-        cartitem = CartItem.query.filter_by(cartid=self.id, itemid=item.id).first()
-        if cartitem:
-            cartitem.quantity += 1
-        else:
-            db.session.add(CartItem(cart=self, item=item, quantity=1))
 
+        price = item.price
+        total = CartItem.add(self.id, item.id, quantity)
+        self.adjust_price(price * quantity)
         db.session.commit()
-        self.update_price()
+        return total * price
 
     def set_quantity(self, item, quantity):
         '''
@@ -152,9 +288,56 @@ class Cart(db.Model):
         if cartitem:
             if quantity <= 0:
                 return self.remove_item(item)
+            self.adjust_price(item.price * (quantity - cartitem.quantity))
             cartitem.quantity = quantity
             db.session.commit()
-            self.update_price()
+
+    def set_quantities(self, quantities, add=False):
+        '''
+        Bulk version of set_quantity(). >quantities< maps Item ids to their new quantity.
+        Every change is applied in one statement batch and one commit; rows set to zero
+        or less are deleted. Item ids that aren't in the Cart are ignored, or with >add<
+        are added to it in the same commit.
+        '''
+
+        if not quantities:
+            return
+        cartitems = CartItem.query.filter(CartItem.cartid == self.id, CartItem.itemid.in_(
+            list(quantities))).options(db.joinedload(CartItem.item)).all()
+
+        delta = 0.0
+        updated = []
+        removed = []
+        for cartitem in cartitems:
+            quantity = quantities[cartitem.itemid]
+            if quantity == cartitem.quantity:
+                continue
+            if quantity <= 0:
+                quantity = 0
+                removed.append(cartitem.id)
+            else:
+                updated.append({'id': cartitem.id, 'quantity': quantity})
+            delta += cartitem.item.price * (quantity - cartitem.quantity)
+
+        added = []
+        if add:
+            present = set(cartitem.itemid for cartitem in cartitems)
+            missing = [itemid for itemid, quantity in quantities.items()
+                if itemid not in present and quantity > 0]
+            if missing:
+                prices = dict(db.session.query(Item.id, Item.price).filter(Item.id.in_(missing)))
+                added = [itemid for itemid in missing if itemid in prices]
+                delta += sum(prices[itemid] * quantities[itemid] for itemid in added)
+
+        if updated:
+            db.session.bulk_update_mappings(CartItem, updated)
+        if removed:
+            CartItem.query.filter(CartItem.id.in_(removed)).delete(synchronize_session=False)
+        for itemid in added:
+            CartItem.add(self.id, itemid, quantities[itemid])
+        if updated or removed or added:
+            self.adjust_price(delta)
+            db.session.commit()
 
     def remove_item(self, item):
         '''
@@ -163,50 +346,98 @@ class Cart(db.Model):
 
         cartitem = CartItem.query.filter_by(cartid=self.id, itemid=item.id).first()
         if cartitem:
+            self.adjust_price(-item.price * cartitem.quantity)
             db.session.delete(cartitem)
             db.session.commit()
-            self.update_price()
         return True
 
-    def update_price(self):
+    def adjust_price(self, delta):
         '''
         Internal cart function. Call this whenever you change the cart's contents.
-        Iterate over items in cart and compute price.
+        Moves cartprice by >delta< in SQL, so concurrent changes to the same cart don't
+        overwrite each other. Doesn't commit; the caller's commit applies it.
         '''
 
-        cartitems = CartItem.query.filter_by(cartid=self.id)
-        total_price = 0.0
-        for cartitem in cartitems:
-            total_price += cartitem.item.price * cartitem.quantity
-        
-        self.cartprice = total_price
+        self.cartprice = db.func.coalesce(Cart.cartprice, 0.0) + delta
+
+    @staticmethod
+    def price_expression():
+        '''
+        SQL expression for the true price of a cart, correlated against the cart row.
+        '''
+
+        return db.select([db.func.coalesce(db.func.sum(CartItem.quantity * Item.price), 0.0)]).where(
+            db.and_(CartItem.cartid == Cart.id, CartItem.itemid == Item.id)).as_scalar()
+
+    def update_price(self):
+        '''
+        Recompute this cart's price from its contents in one aggregate query.
+        Only needed when the price may have drifted, e.g. after a vendor changes a price.
+        '''
+
+        db.session.execute(Cart.__table__.update().where(Cart.id == self.id).values(
+            cartprice=Cart.price_expression()))
         db.session.commit()
 
+    @classmethod
+    def reconcile_prices(cls):
+        '''
+        Fix every cart whose cartprice has drifted from its contents, in one SQL pass.
+        Returns the number of carts that were corrected.
+        '''
+
+        #checking every cart is the point, so this is marked as a full scan for the audit
+        price = cls.price_expression()
+        fixed = db.session.execute(cls.__table__.update().prefix_with(FULL_SCAN).where(db.or_(
+            cls.cartprice == None,
+            db.func.abs(cls.cartprice - price) > 0.005)).values(cartprice=price))
+        db.session.commit()
+        return fixed.rowcount
+
     def checkout(self):
         '''
-        Perform managerial cart checkout tasks with this cart's items.
-        Do NOT call this function unless the checkout is deemed valid elsewhere.
-        No validation is done here. 
+        Check out every CartItem in this cart as a single transaction.
+        Stock is reserved with one conditional UPDATE, so two customers can't buy the same
+        last unit. Returns (number of Orders placed, list of Items without enough stock).
+        If any Item is short, nothing is ordered and the cart is left untouched.
         '''
 
-        cartitems = CartItem.query.filter_by(cartid=self.id)
-        for cartitem in cartitems:
-            db.session.add(Order(
-                item=cartitem.item,
-                quantity=cartitem.quantity,
-                price=(cartitem.item.price*cartitem.quantity),
-                customer=self.customer,
-                vendor=cartitem.item.vendor,
-                name=(self.customer.firstname+" "+self.customer.lastname),
-                address=self.customer.address
-            ))
-            item = Item.query.get(cartitem.itemid)
-            item.stock -= cartitem.quantity
-            db.session.delete(cartitem)
-        
+        cartitems = CartItem.query.filter_by(cartid=self.id).options(
+            db.joinedload(CartItem.item).joinedload(Item.vendor)).all()
+        if not cartitems:
+            return 0, []
+
+        #total quantity wanted per item, summed in SQL and correlated against the item row
+        wanted = db.select([db.func.sum(CartItem.quantity)]).where(db.and_(
+            CartItem.cartid == self.id,
+            CartItem.itemid == Item.id)).as_scalar()
+        itemids = set(cartitem.itemid for cartitem in cartitems)
+        reserved = db.session.execute(Item.__table__.update().where(db.and_(
+            Item.id.in_(itemids),
+            Item.stock >= wanted)).values(stock=Item.stock - wanted))
+
+        if reserved.rowcount != len(itemids):
+            db.session.rollback()
+            short = Item.query.filter(Item.id.in_(itemids), Item.stock < wanted).all()
+            return 0, short
+
+        customer = self.customer
+        db.session.bulk_insert_mappings(Order, [{
+            'itemid': cartitem.itemid,
+            'quantity': cartitem.quantity,
+            'price': cartitem.item.price*cartitem.quantity,
+            'customerid': customer.id,
+            'vendorid': cartitem.item.vendor.id,
+            'name': customer.firstname+" "+customer.lastname,
+            'address': customer.address
+        } for cartitem in cartitems])
+        CartItem.query.filter_by(cartid=self.id).delete(synchronize_session=False)
+        self.cartprice = 0.0
+
+        #the stock UPDATE above bypasses mapper events, so tell the page cache directly
+        mark_changed(db.session, 'items_changed')
         db.session.commit()
-        self.update_price()
-        
+        return len(cartitems), []
 
 
 class CartItem(db.Model):
@@ -217,9 +448,49 @@ class CartItem(db.Model):
 
     id          = db.Column(db.Integer, primary_key=True)
     quantity    = db.Column(db.Integer)
-    itemid      = db.Column(db.Integer, db.ForeignKey('item.id'))
+    itemid      = db.Column(db.Integer, db.ForeignKey('item.id'), index=True)
     cartid      = db.Column(db.Integer, db.ForeignKey('cart.id'))
 
+    #an item appears at most once per cart; this also serves lookups by cartid
+    __table_args__ = (db.Index('ix_cart_item_cartid_itemid', 'cartid', 'itemid', unique=True),)
+
+    @classmethod
+    def add(cls, cartid, itemid, quantity):
+        '''
+        Add >quantity< to the line for Item >itemid< in Cart >cartid<, creating it if needed,
+        and return the line's new quantity. On Postgres and SQLite this is a single
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement.
+        '''
+
+        table = cls.__table__
+        values = {'cartid': cartid, 'itemid': itemid, 'quantity': quantity}
+        dialect = db.session.get_bind().dialect.name
+
+        if dialect == 'postgresql':
+            statement = postgresql.insert(table).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.cartid, table.c.itemid],
+                set_={'quantity': table.c.quantity + statement.excluded.quantity})
+            return db.session.execute(statement.returning(table.c.quantity)).scalar()
+
+        #SQLAlchemy 1.3 has no SQLite upsert construct, so it's written out (needs SQLite
+        #3.24 for ON CONFLICT, and 3.35 to get the quantity back in the same statement)
+        if dialect == 'sqlite' and sqlite3.sqlite_version_info >= (3, 24):
+            upsert = 'INSERT INTO cart_item (cartid, itemid, quantity) ' \
+                'VALUES (:cartid, :itemid, :quantity) ON CONFLICT (cartid, itemid) ' \
+                'DO UPDATE SET quantity = quantity + excluded.quantity'
+            if sqlite3.sqlite_version_info >= (3, 35):
+                return db.session.execute(upsert + ' RETURNING quantity', values).scalar()
+            db.session.execute(upsert, values)
+
+        #anywhere else, increment in SQL and insert if there was no line to increment
+        elif not db.session.execute(table.update().where(db.and_(
+                table.c.cartid == cartid, table.c.itemid == itemid)).values(
+                quantity=table.c.quantity + quantity)).rowcount:
+            db.session.execute(table.insert().values(**values))
+
+        return db.session.query(cls.quantity).filter_by(cartid=cartid, itemid=itemid).scalar()
+
 class Order(db.Model):
     '''
     Whenever a Cart.checkout() is successfully completed, an Order is created for each CartItem.
@@ -232,12 +503,49 @@ class Order(db.Model):
     quantity        = db.Column(db.Integer)
     price           = db.Column(db.Float)
     itemid          = db.Column(db.Integer, db.ForeignKey('item.id'))
-    customerid      = db.Column(db.Integer, db.ForeignKey('user.id'))
-    vendorid        = db.Column(db.Integer, db.ForeignKey('user.id'))
+    customerid      = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    vendorid        = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     
     customer        = db.relationship('User', foreign_keys=[customerid])
     vendor          = db.relationship('User', foreign_keys=[vendorid])
 
+    @classmethod
+    def for_vendor_page(cls, vendor, after=0, limit=None):
+        '''
+        >vendor<'s Orders with an id past >after<, oldest first, with their Items loaded in
+        the same query. Pass the last id of one page as >after< to get the next.
+        '''
+
+        return cls.query.filter(cls.vendorid == vendor.id, cls.id > after).options(
+            db.joinedload(cls.item)).order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def vendor_summary(cls, vendor):
+        '''
+        Revenue, units and open order count for each of >vendor<'s Items with open Orders,
+        aggregated in SQL, biggest revenue first.
+        '''
+
+        revenue = db.func.sum(cls.price).label('revenue')
+        return db.session.query(Item.id, Item.title, revenue,
+            db.func.sum(cls.quantity).label('units'), db.func.count(cls.id).label('orders')).join(
+            cls, cls.itemid == Item.id).filter(cls.vendorid == vendor.id).group_by(
+            Item.id, Item.title).order_by(revenue.desc()).all()
+
+    @classmethod
+    def complete(cls, vendor, ids):
+        '''
+        Mark the Orders in >ids< complete (removing them) with one DELETE.
+        Ids that aren't >vendor<'s own Orders are ignored. Returns how many were completed.
+        '''
+
+        if not ids:
+            return 0
+        completed = cls.query.filter(cls.vendorid == vendor.id, cls.id.in_(ids)).delete(
+            synchronize_session=False)
+        db.session.commit()
+        return completed
+
 #tagging system models
 class Tag(SearchableMixin, db.Model):
     '''
@@ -250,13 +558,5 @@ class Tag(SearchableMixin, db.Model):
 
 class ItemTag(db.Model):
     id      = db.Column(db.Integer, primary_key=True)
-    itemid  = db.Column(db.Integer, db.ForeignKey('item.id'))
-    tagid   = db.Column(db.Integer, db.ForeignKey('tag.id'))
-
-
-        
-
-@login.user_loader
-def load_user(id):
-    return User.query.get(int(id))
-
+    itemid  = db.Column(db.Integer, db.ForeignKey('item.id'), index=True)
+    tagid   = db.Column(db.Integer, db.ForeignKey('tag.id'), index=True)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import pickle
+import time
+from functools import wraps
+from flask import g, request, session, make_response
+from flask_login import current_user
+from app import app
+from app.cache import TTLCache
+from app.commits import watch, on_commit
+from app.models import Item, User
+
+class MemoryStore(object):
+    '''
+    Page store kept in this worker process (LRU with a TTL).
+    '''
+
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize, ttl)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def generation(self):
+        return self.entries.generation
+
+    def set(self, key, entry, generation):
+        self.entries.set(key, entry, generation=generation)
+
+    def clear(self):
+        self.entries.clear()
+
+class FileStore(object):
+    '''
+    Page store shared by every worker on the machine: one file per page in >directory<,
+    written atomically and served until it is >ttl< seconds old. Clearing deletes the
+    files, so an invalidation in one worker applies to all of them. The generation is a
+    random token in a file beside them that every clear replaces.
+    '''
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        self.marker = os.path.join(directory, 'generation')
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def generation(self):
+        try:
+            with open(self.marker) as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def write(self, path, data):
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def set(self, key, entry, generation):
+        path = self.path(key)
+        self.write(path, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        #clear() moves the generation before deleting, so a page that lands after the
+        #deletes is caught here and one that lands before them is deleted
+        if self.generation() != generation:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        self.write(self.marker, os.urandom(8).hex().encode('ascii'))
+        for name in os.listdir(self.directory):
+            if name.startswith('generation'):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+def create_store(config):
+    '''
+    Build the store named by RESPONSE_CACHE: 'memory', 'file', or None to turn caching off.
+    '''
+
+    if config['RESPONSE_CACHE'] == 'memory':
+        return MemoryStore(config['RESPONSE_CACHE_SIZE'], config['RESPONSE_CACHE_TTL'])
+    if config['RESPONSE_CACHE'] == 'file':
+        return FileStore(config['RESPONSE_CACHE_DIR'], config['RESPONSE_CACHE_TTL'])
+    return None
+
+store = create_store(app.config)
+
+def respond(entry):
+    body, mimetype, etag = entry
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    #anonymous and logged-in visitors get different pages for the same URL
+    response.vary.add('Cookie')
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def cached_page(*action_args):
+    '''
+    Cache a view's anonymous GET responses, keyed on path and query string, and answer
+    If-None-Match with 304 using a strong ETag of the page. Requests from logged-in users,
+    requests with flashed messages waiting, and requests carrying any of >action_args<
+    (query arguments that make the view change something) always run the view. A page
+    that made a CSRF token or changed the session is sent but never stored, since it
+    belongs to that one visitor.
+    '''
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if store is None or request.method != 'GET' or '_flashes' in session or \
+                    any(arg in request.args for arg in action_args) or \
+                    current_user.is_authenticated:
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            entry = store.get(key)
+            if entry is None:
+                #a commit that clears the store while the view runs moves the generation,
+                #and the page, which may show the old rows, is then sent but not kept
+                generation = store.generation()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough or \
+                        g.get('csrf_token') or session.modified:
+                    return response
+                body = response.get_data()
+                entry = (body, response.mimetype, hashlib.sha1(body).hexdigest())
+                store.set(key, entry, generation)
+            return respond(entry)
+        return wrapper
+    return decorator
+
+def clear_pages(changed):
+    if store is not None:
+        store.clear()
+
+#drop every cached page once a change to an Item or User is committed. Core statements
+#skip mapper events, so code that changes Items that way (like the stock UPDATE in
+#Cart.checkout) marks 'items_changed' itself
+watch('pages_changed', (Item, User))
+on_commit('pages_changed', clear_pages)
+on_commit('items_changed', clear_pages)
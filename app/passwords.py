@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+
+#hashing is deliberately slow, so at most PASSWORD_HASH_WORKERS hashes run at once and
+#a burst of logins waits for a worker instead of fighting every request for the CPU
+pool = ThreadPoolExecutor(app.config['PASSWORD_HASH_WORKERS'])
+
+class HashingBusy(Exception):
+    '''
+    Raised when no hashing worker came free within PASSWORD_HASH_TIMEOUT seconds.
+    '''
+
+def run(function, *args):
+    future = pool.submit(function, *args)
+    try:
+        return future.result(app.config['PASSWORD_HASH_TIMEOUT'])
+    except TimeoutError:
+        future.cancel()
+        raise HashingBusy()
+
+def hash_password(password):
+    '''
+    Hash >password< with the configured PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH.
+    '''
+
+    return run(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_SALT_LENGTH'])
+
+def verify_password(pwhash, password):
+    return run(check_password_hash, pwhash, password)
+
+@lru_cache()
+def current_method(method, salt_length):
+    #werkzeug stores the resolved method (pbkdf2:sha256 becomes pbkdf2:sha256:150000), so
+    #take it from one real hash rather than from the setting
+    return generate_password_hash('', method, salt_length).split('$')[0]
+
+def needs_rehash(pwhash):
+    '''
+    True if >pwhash< was made with a method or salt length other than the configured ones.
+    '''
+
+    method, salt, digest = (pwhash.split('$') + ['', ''])[:3]
+    return method != current_method(app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_SALT_LENGTH']) or len(salt) != app.config['PASSWORD_SALT_LENGTH']
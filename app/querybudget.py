@@ -0,0 +1,38 @@
+from functools import wraps
+from flask import g, has_app_context
+from sqlalchemy.engine import Engine
+from app import app, db
+
+#while a budgeted view runs, every statement it sends is appended to g.query_budget_log
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        log = g.get('query_budget_log')
+        if log is not None:
+            log.append(statement)
+
+def query_budget(limit):
+    '''
+    Fail a view that runs more than >limit< SQL statements, template rendering included
+    (and the current_user lookup, unless something outside the view did it). Only
+    checked when QUERY_BUDGETS is set (it defaults to on under TESTING), so a test that
+    renders the page catches N+1 regressions; in production the view runs untouched.
+    '''
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config['QUERY_BUDGETS'] and not app.config['TESTING']:
+                return view(*args, **kwargs)
+
+            g.query_budget_log = log = []
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                g.query_budget_log = None
+            if len(log) > limit:
+                raise AssertionError('{} ran {} queries, over its budget of {}:\n{}'.format(
+                    view.__name__, len(log), limit, '\n'.join(log)))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from app import app
+from app.cache import TTLCache
+
+def refill(tokens, stamp, now, rate, burst):
+    '''
+    Token bucket step: top up a bucket holding >tokens< at >stamp< by >rate< per second,
+    up to >burst<, then take one token if there is one. Returns (allowed, tokens left).
+    '''
+
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens >= 1:
+        return True, tokens - 1
+    return False, tokens
+
+class MemoryStore(object):
+    '''
+    Buckets kept in this worker process. A bucket left alone until it would be full again
+    is dropped, so idle keys cost nothing.
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        with self.lock:
+            buckets = self.buckets.get((rate, burst))
+            if buckets is None:
+                buckets = self.buckets[(rate, burst)] = TTLCache(self.maxsize, burst / rate)
+            now = time.time()
+            tokens, stamp = buckets.get(key) or (burst, now)
+            allowed, tokens = refill(tokens, stamp, now, rate, burst)
+            buckets.set(key, (tokens, now))
+            return allowed
+
+class FileStore(object):
+    '''
+    Buckets shared by every worker on the machine: one small file per key in >directory<,
+    updated under an exclusive lock. Files left alone for >idle< seconds hold a full
+    bucket, the same as no file, so they are deleted every >idle< seconds.
+    '''
+
+    def __init__(self, directory, idle):
+        self.directory = directory
+        self.idle = idle
+        self.pruned = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def prune(self, now):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) + self.idle < now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def take(self, key, rate, burst):
+        if time.time() - self.pruned > self.idle:
+            self.pruned = time.time()
+            self.prune(self.pruned)
+        path = os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+        with open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            now = time.time()
+            try:
+                tokens, stamp = [float(value) for value in f.read().split()]
+            except ValueError:
+                tokens, stamp = burst, now
+            allowed, tokens = refill(tokens, stamp, now, rate, burst)
+            f.seek(0)
+            f.truncate()
+            f.write('{} {}'.format(tokens, now))
+            return allowed
+
+def create_store(config):
+    '''
+    Build the store named by LOGIN_RATE_STORE: 'memory', 'file', or None to turn limiting off.
+    '''
+
+    if config['LOGIN_RATE_STORE'] == 'memory':
+        return MemoryStore(config['LOGIN_RATE_KEYS'])
+    if config['LOGIN_RATE_STORE'] == 'file':
+        #the longest any bucket takes to fill up again
+        idle = max(config['LOGIN_BURST_IP'] / config['LOGIN_RATE_IP'],
+            config['LOGIN_BURST_USER'] / config['LOGIN_RATE_USER'])
+        return FileStore(config['LOGIN_RATE_DIR'], idle)
+    return None
+
+store = create_store(app.config)
+
+def login_allowed(address, username):
+    '''
+    Take a token from the bucket for client >address< and the one for >username<.
+    False if either is empty, in which case the attempt should be refused without
+    looking at the password.
+    '''
+
+    if store is None:
+        return True
+    #both buckets are charged, so one busy key can't hide attempts on the other
+    by_address = store.take('ip:' + (address or ''), app.config['LOGIN_RATE_IP'],
+        app.config['LOGIN_BURST_IP'])
+    by_username = store.take('user:' + (username or '').lower(), app.config['LOGIN_RATE_USER'],
+        app.config['LOGIN_BURST_USER'])
+    return by_address and by_username
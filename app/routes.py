@@ -1,13 +1,23 @@
-from flask import render_template, flash, redirect, url_for, request, g
+import csv
+import io
+from flask import render_template, flash, redirect, url_for, request, g, Response, stream_with_context
 from flask_uploads import UploadSet, configure_uploads, IMAGES
 from app import app, db
 
 #login functionality
-from app.forms import LoginForm, RegistrationForm, AddToCartForm, CartQuantitiesForm, SearchForm, ItemForm
+from app.forms import LoginForm, RegistrationForm, AddToCartForm, CartQuantitiesForm, SearchForm, ItemForm, CompleteOrdersForm
 
 #user functionality
 from flask_login import current_user, login_user, logout_user
-from app.models import User, Item, Cart, CartItem, Order
+from app.models import User, Item, CartItem, Order
+from app.featured import featured_cards
+from app.pagecache import cached_page
+from app.querybudget import query_budget
+from app.engine import read_from_primary
+from app.images import store_upload, photo_name, process
+from app.passwords import HashingBusy
+from app.ratelimit import login_allowed
+from app.instrumentation import metrics
 
 #add_item Upload Configurations 
 photos = UploadSet('photos',IMAGES)
@@ -21,8 +31,10 @@ def before_request():
 #homepage
 @app.route('/')
 @app.route('/index')
+@cached_page()
+@query_budget(2)
 def index():
-    return render_template('index.html', title="Front Page", featured=Item.query.filter_by(featured=True))
+    return render_template('index.html', title="Front Page", cards=featured_cards())
 
 #login page
 @app.route('/login', methods=['GET', 'POST'])
@@ -32,14 +44,25 @@ def login():
         return redirect(url_for('index'))
     form = LoginForm()
     if form.validate_on_submit():
+        #refuse floods before doing any database or hashing work
+        if not login_allowed(request.remote_addr, form.username.data):
+            flash('Too many login attempts. Please wait a minute and try again.', 'error')
+            return render_template('login.html', title="Login Page", form=form), 429
+
         user = User.query.filter_by(username=form.username.data).first()
 
+        try:
+            valid = user and user.check_password(form.password.data)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html', title="Login Page", form=form), 503
+
         #this fails if:
         ##the user doesnt exist
         ##the password is wrong (check_password)
         ##the selected usertype is wrong (want users to always know what they're logging in as, even if it's redundant)
         ##the usertype selection doesn't matter if you're logging in as an admin though
-        if not user or not user.check_password(form.password.data) or (user.usertype != form.usertype.data and user.usertype != 'Admin'):
+        if not valid or (user.usertype != form.usertype.data and user.usertype != 'Admin'):
             flash('No such user exists.', 'error')
             return redirect(url_for('login'))
         login_user(user, remember=form.remember.data)
@@ -67,7 +90,11 @@ def register():
             lastname=form.lastname.data,
             usertype=form.usertype.data)
             
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('register.html', title='Register', form=form), 503
         user.initialize_cart()
         db.session.add(user)
         db.session.commit()
@@ -77,11 +104,18 @@ def register():
 
 #product page routing
 @app.route('/product/<pid>', methods=['GET', 'POST'])
+@cached_page('featuring')
+@query_budget(6)
+@read_from_primary
 def product(pid):
-    item = Item.query.filter_by(id=pid).first()
+    item = Item.for_product_page(pid)
     if item:
-        form = AddToCartForm()
-        if request.method == 'POST' and not request.args.get('featuring'):
+        #only customers get the add to cart form, so the page cached for anonymous
+        #visitors never carries anyone's CSRF token
+        form = None
+        if current_user.is_authenticated and current_user.usertype == 'Customer':
+            form = AddToCartForm()
+        if form and form.validate_on_submit() and not request.args.get('featuring'):
             current_user.cart.add_item(item)
             flash('Add to cart successful.')
             return redirect(url_for('cart')) 
@@ -101,6 +135,8 @@ def product(pid):
 
 
 @app.route('/cart', methods=['GET', 'POST'])
+@query_budget(7)
+@read_from_primary
 def cart():
     if current_user.is_anonymous:
         flash('You must register to buy items!', 'error')
@@ -113,13 +149,13 @@ def cart():
     else:
         editing = False
         form = None
-        cart = Cart.query.filter_by(customerid=current_user.id).first()
+        cart = current_user.cart
         if request.args.get('removed'):
             flash('Item removed from cart.')
             cart.remove_item(Item.query.get(request.args.get('removed')))
             return redirect(url_for('cart'))
 
-        cartitems = CartItem.query.filter_by(cartid=cart.id)
+        cartitems = cart.lines()
 
         if request.args.get('edit'):
             editing = True
@@ -131,8 +167,8 @@ def cart():
             form = CartQuantitiesForm(quantities=quantities)
         
         if form and request.method == 'POST':
-            for i, cartitem in enumerate(cartitems):
-                current_user.cart.set_quantity(cartitem.item, form.quantities[i].quantity.data)
+            cart.set_quantities({cartitem.itemid: form.quantities[i].quantity.data
+                for i, cartitem in enumerate(cartitems)})
 
             flash('Quantities saved.')
             return redirect(url_for('cart'))
@@ -140,28 +176,22 @@ def cart():
         return render_template('cart.html', cartitems=cartitems, ccart=cart, editing=editing, form=form)
 
 @app.route('/cart/checkout', methods=['GET','POST'])
+@query_budget(8)
+@read_from_primary
 def checkout():
     if not current_user.is_anonymous and current_user.usertype=='Customer':
-        cart = Cart.query.filter_by(customerid=current_user.id).first()
-        cartitems = CartItem.query.filter_by(cartid=cart.id)
-        if cartitems:
-            error_str = 'Vendor does not have enough items to fulfill order for: '
-            errors = 0
-            for cartitem in cartitems:
-                if cartitem.quantity >= cartitem.item.stock:
-                    error_str += cartitem.item.title + ', '
-                    errors += 1
-
-        else:
-            error_str += 'Cart is empty.  '
-            errors += 1
+        cart = current_user.cart
+        placed, short = cart.checkout()
+        if short:
+            flash('Vendor does not have enough items to fulfill order for: ' + 
+                ', '.join(item.title for item in short), 'error')
+            return redirect(url_for('cart'))
 
-        if errors > 0:
-            flash(error_str[:-2], 'error')
+        elif not placed:
+            flash('Cart is empty.', 'error')
             return redirect(url_for('cart'))
         
         else:
-            cart.checkout()
             flash('Purchase successful. Vendors have been notified.')
             return redirect(url_for('index'))
     
@@ -170,12 +200,24 @@ def checkout():
 
 
 @app.route('/search')
+@query_budget(2)
 def search():
     if not g.search_form.validate():
         return redirect(url_for('index'))
-    items, total = Item.search(g.search_form.query.data, 1, 10)
+    #a page below 1 would give the search backend a negative offset
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['ITEMS_PER_PAGE']
+    items, total, cursor = Item.search(g.search_form.query.data, page, per_page, 
+        request.args.get('after'))
+
+    #next page continues from this page's last hit; previous pages are addressed by number
+    next_url = url_for('search', query=g.search_form.query.data, page=page + 1, after=cursor) \
+        if cursor and page * per_page < total else None
+    prev_url = url_for('search', query=g.search_form.query.data, page=page - 1) \
+        if page > 1 else None
     
-    return render_template('search.html', items=items)
+    return render_template('search.html', items=items, total=total, page=page, 
+        next_url=next_url, prev_url=prev_url)
 
 ##vendor stuff
 #add_item page
@@ -183,16 +225,22 @@ def search():
 def add_item():
         form = ItemForm()
         if request.method == 'POST' and request.files and 'photo' in request.files and form.validate_on_submit():
-            filename = photos.save(request.files['photo'])
-            #url = photos.url(filename)
+            photo = request.files['photo']
+            if not photos.file_allowed(photo, photo.filename):
+                flash('Photos must be images.', 'error')
+                return render_template('add_item.html', title="Add Item", form=form)
+
+            #stored once per distinct photo; the resized copies are made in the background
+            key, name = store_upload(photo)
             item = Item(title=form.name.data,
                 price=form.price.data,
                 description=form.description.data,
                 stock=form.stock.data,
                 vendorid=current_user.id,
-                image=filename)
+                image=photo_name(name))
             db.session.add(item)
             db.session.commit()
+            process(item, key, name)
             flash("Congratulations, your item has been added")
             return redirect(url_for('inventory',username=current_user.username))
         else:
@@ -200,6 +248,7 @@ def add_item():
 
 #inventory page
 @app.route('/inventory',methods=["GET"])
+@read_from_primary
 def inventory():
     if not current_user.is_anonymous and current_user.usertype == 'Vendor':
         items = Item.query.filter_by(vendorid = current_user.id).all()
@@ -216,30 +265,36 @@ def inventory():
 ##profile pages
 #vendor page
 @app.route('/vendor/<username>', methods=['GET', 'POST'])
+@cached_page()
+@query_budget(4)
 def vendor(username):
     user = User.query.filter_by(username=username).first()
-    if request.args.get('completed'):
-        flash('Order marked as complete.')
-        db.session.delete(Order.query.get(request.args.get('completed')))
-        db.session.commit()
-
-        return redirect(url_for('vendor', username=username))
 
     if user and user.usertype == 'Vendor':
-        if current_user.username == user.username:
-            orders = Order.query.filter_by(vendor=current_user)
-            items = []
-        else:
-            orders = []
-            items = Item.query.filter_by(vendor=user)
-
-        return render_template('vendor.html', vendor=user, items=items, orders=orders)
+        if current_user.is_authenticated and current_user.id == user.id:
+            #the checked orders are completed together in one statement
+            form = CompleteOrdersForm()
+            if form.validate_on_submit():
+                completed = Order.complete(user, request.form.getlist('order', type=int))
+                flash('{} order{} marked as complete.'.format(completed, '' if completed == 1 else 's'))
+                return redirect(url_for('vendor', username=username))
+
+            per_page = app.config['ORDERS_PER_PAGE']
+            orders = Order.for_vendor_page(user, request.args.get('after', 0, type=int), per_page + 1)
+            next_url = url_for('vendor', username=username, after=orders[per_page - 1].id) \
+                if len(orders) > per_page else None
+            return render_template('vendor.html', vendor=user, items=[], orders=orders[:per_page], 
+                summary=Order.vendor_summary(user), form=form, next_url=next_url)
+
+        items = Item.query.filter_by(vendor=user).all()
+        return render_template('vendor.html', vendor=user, items=items, orders=[])
 
     else:
         return render_template('404.html')
 
 #customer page
 @app.route('/user/<username>')
+@query_budget(2)
 def customer(username):
     user = User.query.filter_by(username=username).first()
     if user and user.usertype == 'Customer':
@@ -250,6 +305,7 @@ def customer(username):
 
 #admin page
 @app.route('/admin/<username>')
+@query_budget(3)
 def admin(username):
     user = User.query.filter_by(username=username).first()
     if user and user.usertype == 'Admin':
@@ -257,8 +313,45 @@ def admin(username):
             return render_template('403.html')
         
         else:
-            return render_template('admin.html', admin=user, users=User.query.all())
+            #one page of users past the >after< id, plus one row to tell if there's more
+            usertype = request.args.get('usertype') or None
+            per_page = app.config['USERS_PER_PAGE']
+            users = User.listing(request.args.get('after', 0, type=int), usertype, per_page + 1)
+            next_url = url_for('admin', username=username, usertype=usertype, 
+                after=users[per_page - 1].id) if len(users) > per_page else None
+            return render_template('admin.html', admin=user, users=users[:per_page], 
+                usertype=usertype, next_url=next_url)
     
     else:
         return render_template('404.html')
 
+#every user as CSV, streamed a batch at a time
+@app.route('/admin/<username>/users.csv')
+def admin_export(username):
+    user = User.query.filter_by(username=username).first()
+    if not user or user.usertype != 'Admin':
+        return render_template('404.html')
+    if current_user.is_anonymous or current_user.usertype != 'Admin':
+        return render_template('403.html')
+
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(User.listing_columns)
+        for row in User.listing_batches(request.args.get('usertype') or None):
+            writer.writerow(row)
+            if buffer.tell() > 8192:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(rows()), mimetype='text/csv', 
+        headers={'Content-Disposition': 'attachment; filename=users.csv'})
+
+#per-endpoint timings for Prometheus
+@app.route('/metrics')
+def metrics_export():
+    if current_user.is_anonymous or current_user.usertype != 'Admin':
+        return render_template('403.html'), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,29 +1,142 @@
-from app import app
+import atexit
+import fcntl
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from app import app, db
+from app.cache import TTLCache
+from app.instrumentation import timed
 
-def add_to_index(index, model):
-    #currently, elasticsearch will always be running so this conditional isn't necessary
-    if not app.elasticsearch:
-        return
-    
+#query_index results keyed by (index, expression, page, per_page)
+result_cache = TTLCache(app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL'])
+
+def invalidate_results(index):
+    result_cache.invalidate(lambda key: key[0] == index)
+
+def payload_for(model):
     payload = {}
     for field in model.__searchable__:
         payload[field] = getattr(model, field)
-    app.elasticsearch.index(index=index, doc_type=index, id=model.id, body=payload)
+    return payload
+
+def add_to_index(index, model):
+    app.search_backend.enqueue(index, model.id, 'index', payload_for(model))
 
 def remove_from_index(index, model):
-    if not app.elasticsearch:
-        return
-    app.elasticsearch.delete(index=index, doc_type=index, id=model.id)
-
-def query_index(index, query, page, per_page):
-    if not app.elasticsearch:
-        return [], 0
-
-    #generate elasticsearch search object
-    #search will return a JSON object with the search diagnostics
-    search = app.elasticsearch.search(
-        index=index,
-        #doc_type=index,
+    app.search_backend.enqueue(index, model.id, 'delete')
+
+def encode_cursor(sort):
+    return '{!r},{}'.format(sort[0], sort[1])
+
+def decode_cursor(cursor):
+    #a mangled cursor just falls back to addressing the page by number
+    try:
+        score, id = cursor.split(',', 1)
+        score = float(score)
+        int(id)
+    except ValueError:
+        return None
+    return [score, id] if math.isfinite(score) else None
+
+def query_index(index, query, page, per_page, after=None):
+    '''
+    Returns (ids of one page of hits, total hits, cursor for the page after this one).
+    Pages are normally addressed by >page<, which costs more the deeper it goes; passing the
+    cursor from the previous page as >after< uses search_after instead, so every page
+    costs the same.
+    '''
+
+    if not app.search_backend.enabled:
+        return [], 0, None
+
+    key = (index, query, page, per_page, after)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with timed('search_seconds'):
+        result = app.search_backend.query(index, query, page, per_page, after and decode_cursor(after))
+    result_cache.set(key, result)
+    return result
+
+def rebuild_index(index, batches, workers=4, report=None):
+    '''
+    Rebuild >index< from >batches< (an iterable of lists of (id, payload) pairs) without
+    taking search down while it runs. >report< is called with (documents sent, failed
+    documents) after each batch. Returns the name of the new index.
+    '''
+
+    if not app.search_backend.enabled:
+        return None
+    target = app.search_backend.rebuild(index, batches, workers, report)
+    invalidate_results(index)
+    return target
+
+class SearchBackend(object):
+    '''
+    Interface every search backend implements. app.search_backend holds the one chosen by
+    the SEARCH_BACKEND setting; see create_backend().
+    '''
+
+    #whether SearchableMixin has to hand over committed changes through enqueue()
+    needs_changes = True
+    #whether search_models() can rank and load model rows in a single SQL statement
+    joins_in_sql = False
+
+    @property
+    def enabled(self):
+        return True
+
+    def enqueue(self, index, id, op, body=None):
+        '''
+        Apply, now or soon, an 'index' (with its >body<) or 'delete' operation for >id<.
+        '''
+
+        raise NotImplementedError
+
+    def query(self, index, query, page, per_page, after=None):
+        '''
+        Returns (ids, total, cursor) like query_index(). >after< is a decoded cursor.
+        '''
+
+        raise NotImplementedError
+
+    def rebuild(self, index, batches, workers=4, report=None):
+        raise NotImplementedError
+
+class ElasticsearchBackend(SearchBackend):
+    '''
+    Search through an Elasticsearch cluster at >url<. The client is only created the first
+    time it is needed, and changes are sent through a background IndexQueue.
+    '''
+
+    def __init__(self, url, client=None, **queue_options):
+        self.url = url
+        self._client = client
+        self.queue = IndexQueue(lambda: self.client, **queue_options)
+
+    @property
+    def enabled(self):
+        return bool(self.url or self._client)
+
+    @property
+    def client(self):
+        if self._client is None and self.url:
+            from elasticsearch import Elasticsearch
+            self._client = Elasticsearch([self.url])
+        return self._client
+
+    def enqueue(self, index, id, op, body=None):
+        self.queue.enqueue(index, id, op, body)
+
+    def query(self, index, query, page, per_page, after=None):
+        #generate elasticsearch search object
+        #search will return a JSON object with the search diagnostics
         body = {
             'query': {
                 'multi_match': {
@@ -31,11 +144,582 @@ def query_index(index, query, page, per_page):
                     'fields': ['*']
                 }
             },
-            'from': (page - 1) * per_page,
+            #_id breaks ties between equal scores so search_after cursors are stable
+            'sort': [{'_score': 'desc'}, {'_id': 'asc'}],
             'size': per_page
         }
-    )
+        if after:
+            body['search_after'] = after
+        else:
+            body['from'] = (page - 1) * per_page
+        search = self.client.search(
+            index=index,
+            #doc_type=index,
+            body=body
+        )
+
+        #all we care about are the list of IDs of objects in the 'hits' field of the JSON object
+        hits = search['hits']['hits']
+        ids = [int(hit['_id']) for hit in hits]
+        total = search['hits']['total']
+        if isinstance(total, dict):
+            total = total['value']
+        cursor = encode_cursor(hits[-1]['sort']) if hits else None
+        return ids, total, cursor
+
+    def rebuild(self, index, batches, workers=4, report=None):
+        '''
+        Build a fresh, versioned copy of >index<, sending one _bulk request per batch from a
+        pool of >workers< threads. When every batch is in, the >index< alias is swapped to the
+        new copy in one atomic request and the old copies are deleted. Changes queued while
+        it runs go to both copies and are replayed into the new one before the swap, so it
+        misses nothing; if the build fails the new copy is deleted and the alias is untouched.
+        '''
+
+        es = self.client
+        target = '{}-{}'.format(index, int(time.time() * 1000))
+        es.indices.create(index=target)
+        self.queue.mirror(index, target)
+        try:
+            self.load(target, batches, workers, report)
+            #a batch may have read a row before a change to it was queued, so send every
+            #change made during the load again now that the load is done
+            self.queue.flush()
+            self.queue.replay(index)
+            es.indices.refresh(index=target)
+        except Exception:
+            self.queue.unmirror(index)
+            es.indices.delete(index=target, ignore=[404])
+            raise
+
+        #point the alias at the new copy; a concrete index left over from before aliases were
+        #used is removed in the same request
+        actions = [{'add': {'index': target, 'alias': index}}]
+        old = []
+        if es.indices.exists_alias(name=index):
+            old = list(es.indices.get_alias(name=index))
+            actions += [{'remove': {'index': name, 'alias': index}} for name in old]
+        elif es.indices.exists(index=index):
+            actions.append({'remove_index': {'index': index}})
+        es.indices.update_aliases(body={'actions': actions})
+        self.queue.unmirror(index)
+        for name in old:
+            es.indices.delete(index=name)
+
+        return target
+
+    def load(self, target, batches, workers, report):
+        '''
+        Internal rebuild function. Bulk index >batches< of (id, payload) into >target<.
+        '''
+
+        es = self.client
+
+        counts = {'sent': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def send(batch):
+            actions = []
+            for id, payload in batch:
+                actions.append({'index': {'_index': target, '_id': id}})
+                actions.append(payload)
+            response = es.bulk(body=actions, index=target)
+            failed = 0
+            if response.get('errors'):
+                failed = sum(1 for item in response['items'] if item['index'].get('error'))
+            with counts_lock:
+                counts['sent'] += len(batch)
+                counts['failed'] += failed
+                if report:
+                    report(counts['sent'], counts['failed'])
+
+        #keep a bounded number of batches in flight so the table is never fully in memory
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = []
+            for batch in batches:
+                in_flight.append(pool.submit(send, batch))
+                if len(in_flight) >= workers * 2:
+                    in_flight.pop(0).result()
+            for future in in_flight:
+                future.result()
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+class InvertedIndex(object):
+    '''
+    One in-process index: term -> {document id: term frequency}, plus each document's terms
+    so it can be removed again. All of a document's searchable fields are indexed together.
+    '''
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.total_length = 0
+
+    def add(self, id, payload):
+        self.remove(id)
+        terms = Counter()
+        for value in payload.values():
+            if value:
+                terms.update(tokenize(str(value)))
+        length = sum(terms.values())
+        self.documents[id] = (length, terms)
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[id] = frequency
+
+    def remove(self, id):
+        document = self.documents.pop(id, None)
+        if document is None:
+            return
+        length, terms = document
+        self.total_length -= length
+        for term in terms:
+            postings = self.postings[term]
+            del postings[id]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query, k1=1.2, b=0.75):
+        '''
+        Returns every (score, id) matching any term of >query<, best first, scored with BM25.
+        '''
+
+        count = len(self.documents)
+        if not count:
+            return []
+        average = float(self.total_length) / count or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for id, frequency in postings.items():
+                length = self.documents[id][0]
+                scores[id] = scores.get(id, 0.0) + idf * frequency * (k1 + 1) / (
+                    frequency + k1 * (1 - b + b * length / average))
+        #same order as the Elasticsearch backend: score, then id compared as a string
+        return sorted(((score, id) for id, score in scores.items()), 
+            key=lambda hit: (-hit[0], str(hit[1])))
+
+class MemoryBackend(SearchBackend):
+    '''
+    Pure-Python search for deployments without Elasticsearch: an inverted index per search
+    index, ranked with BM25 and kept current by the same SearchableMixin commit hooks.
+    Each worker process holds its own copy and shares its changes through >snapshot<: it
+    saves at most every >interval< seconds while changing, after a rebuild and at exit,
+    merging its changes into whatever other workers saved meanwhile, and picks up their
+    saves before searching. So another worker's change shows up within about >interval<
+    seconds. It suits small deployments.
+    '''
+
+    def __init__(self, snapshot=None, interval=5.0):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.indexes = {}
+        self.lock = threading.RLock()
+        #changes made in this process since its last save: (index, id) -> (op, body), and
+        #indexes rebuilt here, which replace the saved ones outright
+        self.journal = {}
+        self.rebuilt = {}
+        #changes made to an index while it is being rebuilt, replayed onto the new copy
+        self.during = {}
+        self.loaded = None
+        self.saved = time.time()
+        self.refresh()
+        atexit.register(self.save)
+
+    def modified(self):
+        try:
+            return os.path.getmtime(self.snapshot)
+        except OSError:
+            return None
+
+    def read(self):
+        try:
+            with open(self.snapshot, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            app.logger.exception('Could not load search snapshot %s', self.snapshot)
+            return None
+
+    def merged(self, indexes):
+        '''
+        Internal function. >indexes< read from the snapshot, with this process's unsaved
+        changes put back on top. Call holding the lock.
+        '''
+
+        indexes.update(self.rebuilt)
+        for (index, id), (op, body) in self.journal.items():
+            apply(indexes.setdefault(index, InvertedIndex()), id, op, body)
+        return indexes
+
+    def refresh(self):
+        '''
+        Load the snapshot if another process (or a reindex) has saved it since it was
+        last loaded here.
+        '''
+
+        if not self.snapshot:
+            return
+        modified = self.modified()
+        if modified is None or modified == self.loaded:
+            return
+        indexes = self.read()
+        with self.lock:
+            self.loaded = modified
+            if indexes is not None:
+                self.indexes = self.merged(indexes)
+        for index in self.indexes:
+            invalidate_results(index)
+
+    def save(self):
+        if not self.snapshot or not (self.journal or self.rebuilt):
+            return
+        with self.lock:
+            #hold an exclusive lock so two workers merging at once can't drop each other's
+            #changes; write to a temporary file and rename it, so readers never see half a
+            #snapshot
+            with open(self.snapshot + '.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                indexes = self.indexes
+                if self.modified() not in (None, self.loaded):
+                    indexes = self.merged(self.read() or self.indexes)
+                temp = '{}.{}.tmp'.format(self.snapshot, os.getpid())
+                with open(temp, 'wb') as f:
+                    pickle.dump(indexes, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(temp, self.snapshot)
+                self.indexes = indexes
+                self.loaded = self.modified()
+                self.journal = {}
+                self.rebuilt = {}
+                self.saved = time.time()
+
+    def enqueue(self, index, id, op, body=None):
+        with self.lock:
+            apply(self.indexes.setdefault(index, InvertedIndex()), id, op, body)
+            self.journal[(index, id)] = (op, body)
+            if index in self.during:
+                self.during[index][id] = (op, body)
+        invalidate_results(index)
+        if self.snapshot and time.time() - self.saved > self.interval:
+            self.save()
+
+    def query(self, index, query, page, per_page, after=None):
+        self.refresh()
+        with self.lock:
+            target = self.indexes.get(index)
+            hits = target.search(query) if target else []
+        total = len(hits)
+        if after:
+            score, id = after
+            hits = [hit for hit in hits if hit[0] < score or (hit[0] == score and str(hit[1]) > id)]
+        else:
+            hits = hits[(page - 1) * per_page:]
+        hits = hits[:per_page]
+        cursor = encode_cursor([hits[-1][0], hits[-1][1]]) if hits else None
+        return [id for score, id in hits], total, cursor
+
+    def rebuild(self, index, batches, workers=4, report=None):
+        #build off to the side and swap it in, so searches keep using the old copy meanwhile
+        target = InvertedIndex()
+        with self.lock:
+            self.during[index] = {}
+        sent = 0
+        try:
+            for batch in batches:
+                for id, payload in batch:
+                    target.add(id, payload)
+                sent += len(batch)
+                if report:
+                    report(sent, 0)
+        finally:
+            with self.lock:
+                during = self.during.pop(index)
+        with self.lock:
+            #a batch may have read a row before a change to it arrived, so apply those again
+            for id, (op, body) in during.items():
+                apply(target, id, op, body)
+            self.indexes[index] = target
+            self.rebuilt[index] = target
+            self.journal = dict((key, entry) for key, entry in self.journal.items()
+                if key[0] != index)
+        self.save()
+        invalidate_results(index)
+        return index
+
+def apply(target, id, op, body):
+    if op == 'delete':
+        target.remove(id)
+    else:
+        target.add(id, body)
+
+class IndexQueue(object):
+    '''
+    Background indexing pipeline. Commit hooks enqueue (index, id, op) entries, and a worker
+    thread flushes them to Elasticsearch through the _bulk API once >batch_size< entries are
+    pending or >flush_interval< seconds have passed since the oldest one was queued.
+    Entries for the same (index, id) are coalesced, so only the latest operation is sent.
+    When >max_pending< entries are waiting, enqueue() blocks for up to >put_timeout< seconds
+    and then drops the entry, so an unreachable cluster can't hang the web workers.
+    >client< is a callable returning the Elasticsearch client (or anything with a .bulk()),
+    which lets tests hand in an in-process fake.
+    '''
+
+    def __init__(self, client, batch_size=500, flush_interval=1.0, max_pending=10000, put_timeout=5.0):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.pending = {}
+        self.oldest = None
+        self.dropped = 0
+        self.lock = threading.Condition()
+        self.worker = None
+        self.stopping = False
+        self.registered = False
+        #index -> (copy being rebuilt, {id: latest (op, body)} queued since mirror())
+        self.mirrors = {}
+
+    @property
+    def enabled(self):
+        return bool(self.client())
+
+    def start(self):
+        with self.lock:
+            if self.worker and self.worker.is_alive():
+                return
+            self.stopping = False
+            self.worker = threading.Thread(target=self.run, name='search-index-queue', daemon=True)
+            self.worker.start()
+            #one exit hook however many times the worker is restarted
+            if not self.registered:
+                atexit.register(self.stop)
+                self.registered = True
+
+    def enqueue(self, index, id, op, body=None):
+        '''
+        Queue an 'index' (with its >body<) or 'delete' operation for document >id<.
+        '''
+
+        if not self.enabled:
+            return
+        if not self.worker:
+            self.start()
+
+        key = (index, id)
+        with self.lock:
+            deadline = time.time() + self.put_timeout
+            while key not in self.pending and len(self.pending) >= self.max_pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.dropped += 1
+                    app.logger.warning('Search index queue full, dropped %s %s/%s', op, index, id)
+                    return
+                self.lock.wait(remaining)
+
+            self.pending[key] = (op, body)
+            if index in self.mirrors:
+                self.mirrors[index][1][id] = (op, body)
+            #wake the worker when its flush timer starts (it sleeps with no timeout while
+            #the queue is empty) and when a full batch is ready
+            if self.oldest is None:
+                self.oldest = time.time()
+                self.lock.notify_all()
+            elif len(self.pending) >= self.batch_size:
+                self.lock.notify_all()
+
+    def take(self):
+        '''
+        Internal queue function. Swap out and return everything pending. Call holding the lock.
+        '''
+
+        batch = self.pending
+        self.pending = {}
+        self.oldest = None
+        self.lock.notify_all()
+        return batch
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.stopping and (self.oldest is None or (
+                        len(self.pending) < self.batch_size and
+                        time.time() - self.oldest < self.flush_interval)):
+                    timeout = None if self.oldest is None else \
+                        self.flush_interval - (time.time() - self.oldest)
+                    self.lock.wait(timeout)
+                batch = self.take()
+                stopping = self.stopping
+
+            self.send(batch)
+            if stopping:
+                return
+
+    def send(self, batch):
+        '''
+        Send a batch of coalesced entries as _bulk requests of at most >batch_size< operations.
+        '''
+
+        client = self.client()
+        if not batch or not client:
+            return
+        with self.lock:
+            mirrors = dict((index, target) for index, (target, touched) in self.mirrors.items())
+        entries = list(batch.items())
+        entries += [((mirrors[index], id), entry) for (index, id), entry in entries
+            if index in mirrors]
+        for start in range(0, len(entries), self.batch_size):
+            actions = []
+            for (index, id), (op, body) in entries[start:start + self.batch_size]:
+                actions.append({op: {'_index': index, '_id': id}})
+                if op == 'index':
+                    actions.append(body)
+            try:
+                client.bulk(body=actions)
+            except Exception:
+                app.logger.exception('Bulk index request failed; %d operations lost', 
+                    len(actions))
+        for index in set(index for (index, id) in batch):
+            invalidate_results(index)
+
+    def mirror(self, index, target):
+        '''
+        Until unmirror(), also send operations on >index< to the index >target<, and keep
+        the latest one for each document so replay() can send them again.
+        '''
+
+        with self.lock:
+            self.mirrors[index] = (target, {})
+
+    def unmirror(self, index):
+        with self.lock:
+            self.mirrors.pop(index, None)
+
+    def replay(self, index):
+        '''
+        Synchronously resend every operation queued for >index< since mirror() to its copy.
+        '''
+
+        with self.lock:
+            target, touched = self.mirrors[index]
+            batch = dict(((target, id), entry) for id, entry in touched.items())
+        self.send(batch)
+
+    def flush(self):
+        '''
+        Synchronously send everything pending, from the calling thread.
+        '''
+
+        with self.lock:
+            batch = self.take()
+        self.send(batch)
+
+    def stop(self):
+        '''
+        Flush-on-shutdown hook: stop the worker and send whatever is still pending.
+        '''
+
+        with self.lock:
+            self.stopping = True
+            self.lock.notify_all()
+            worker = self.worker
+        if worker and worker.is_alive() and worker is not threading.current_thread():
+            worker.join()
+        self.worker = None
+        self.flush()
+
+class SQLiteBackend(SearchBackend):
+    '''
+    Search with the SQLite FTS5 tables (<index>_fts) created by the full-text search
+    migration, whose triggers keep them in sync inside the same transaction as every write.
+    Nothing is queued or sent over the network, and SearchableMixin.search ranks with bm25()
+    and joins back to the model table in one statement.
+    '''
+
+    needs_changes = False
+    joins_in_sql = True
+
+    @staticmethod
+    def match_expression(query):
+        #quote every word so user input can't use (or break) FTS5 query syntax; any word matches
+        return ' OR '.join('"{}"'.format(word) for word in tokenize(query))
+
+    @staticmethod
+    def ranked(index, match):
+        #FTS5's hidden rank column is bm25(), lower-is-better (calling bm25() directly isn't
+        #allowed once SQLite flattens this into the outer join); the window count gives the
+        #total in the same statement
+        return db.text(
+            'SELECT rowid, rank, count(*) OVER () AS total '
+            'FROM {0}_fts WHERE {0}_fts MATCH :match'.format(index)).bindparams(
+            match=match).columns(db.column('rowid', db.Integer), db.column('rank', db.Float),
+            db.column('total', db.Integer)).alias('ranked')
+
+    def page(self, query, ranked, id_column, page, per_page, after):
+        query = query.order_by(ranked.c.rank, id_column)
+        if after:
+            rank, id = after
+            query = query.filter(db.or_(ranked.c.rank > rank, db.and_(
+                ranked.c.rank == rank, id_column > int(id))))
+        else:
+            query = query.offset((page - 1) * per_page)
+        return query.limit(per_page).all()
+
+    def search_models(self, query, id_column, index, expression, page, per_page, after=None):
+        '''
+        Returns (one page of the model rows from >query< matching >expression<, best first,
+        total hits, cursor), ranked and loaded by a single statement.
+        '''
+
+        match = self.match_expression(expression)
+        if not match:
+            return [], 0, None
+        ranked = self.ranked(index, match)
+        after = after and decode_cursor(after)
+        rows = self.page(query.join(ranked, ranked.c.rowid == id_column).add_columns(
+            ranked.c.rank, ranked.c.total), ranked, id_column, page, per_page, after)
+        if not rows:
+            return [], 0, None
+        obj, rank, total = rows[-1]
+        return [row[0] for row in rows], total, encode_cursor([rank, obj.id])
+
+    def query(self, index, query, page, per_page, after=None):
+        match = self.match_expression(query)
+        if not match:
+            return [], 0, None
+        ranked = self.ranked(index, match)
+        rows = self.page(db.session.query(ranked), ranked, ranked.c.rowid, page, per_page, after)
+        if not rows:
+            return [], 0, None
+        return [row.rowid for row in rows], rows[0].total, encode_cursor([rows[-1].rank, rows[-1].rowid])
+
+    def enqueue(self, index, id, op, body=None):
+        #the triggers already did it
+        pass
+
+    def rebuild(self, index, batches, workers=4, report=None):
+        db.session.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(index))
+        db.session.commit()
+        if report:
+            report(db.session.execute('SELECT count(*) FROM {}'.format(index)).scalar(), 0)
+        return index + '_fts'
+
+def create_backend(config):
+    '''
+    Build the search backend named by SEARCH_BACKEND: 'elasticsearch', 'memory' or 'sqlite'.
+    '''
+
+    if config['SEARCH_BACKEND'] == 'memory':
+        return MemoryBackend(config['SEARCH_SNAPSHOT'])
+    if config['SEARCH_BACKEND'] == 'sqlite':
+        return SQLiteBackend()
+    return ElasticsearchBackend(config['ELASTICSEARCH_URL'],
+        batch_size=config['ELASTICSEARCH_BATCH_SIZE'],
+        flush_interval=config['ELASTICSEARCH_FLUSH_INTERVAL'],
+        max_pending=config['ELASTICSEARCH_QUEUE_SIZE'])
 
-    #all we care about are the list of IDs of objects in the 'hits' field of the JSON object
-    ids = [int(hit['_id']) for hit in search['hits']['hits']]
-    return ids, search['hits']['total']
+app.search_backend = create_backend(app.config)
@@ -0,0 +1,61 @@
+'''
+Micro-benchmarks for the hot paths: cart updates, checkout, search and the front page.
+'''
+
+from app.models import User, Item
+from app.search import result_cache
+from app.featured import invalidate_featured
+from benchmarks.datagen import ADJECTIVES, NOUNS
+
+def customer_cart(number=0):
+    return User.query.filter_by(username='customer{}'.format(number)).first().cart
+
+def random_item(rng, catalogue):
+    return Item.query.get(rng.randint(1, catalogue['items']))
+
+def test_add_item(benchmark, ctx, rng, catalogue):
+    cart = customer_cart()
+    items = [random_item(rng, catalogue) for i in range(50)]
+    benchmark(lambda: cart.add_item(rng.choice(items)))
+
+def test_update_price(benchmark, ctx):
+    cart = customer_cart(1)
+    benchmark(cart.update_price)
+
+def test_checkout(benchmark, ctx, rng, catalogue):
+    cart = customer_cart(2)
+    cart.set_quantities(dict((line.itemid, 0) for line in cart.items))
+    items = [random_item(rng, catalogue) for i in range(50)]
+
+    #each round checks out a freshly filled cart of three lines
+    def fill():
+        for item in rng.sample(items, 3):
+            cart.add_item(item)
+
+    placed = benchmark.pedantic(lambda: cart.checkout()[0], setup=fill, rounds=50)
+    assert placed == 3
+
+def test_search_uncached(benchmark, ctx, rng):
+    def query():
+        result_cache.clear()
+        return Item.search('{} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS)), 1, 10)
+
+    items, total, cursor = benchmark(query)
+    assert total
+
+def test_search_cached(benchmark, ctx):
+    items, total, cursor = benchmark(Item.search, 'wireless keyboard', 1, 10)
+    assert total
+
+def test_index_cold(benchmark, ctx):
+    client = ctx.test_client()
+
+    def render():
+        invalidate_featured()
+        return client.get('/')
+
+    assert benchmark(render).status_code == 200
+
+def test_index_warm(benchmark, ctx):
+    client = ctx.test_client()
+    assert benchmark(client.get, '/').status_code == 200
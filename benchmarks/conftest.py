@@ -0,0 +1,44 @@
+'''
+Fixtures for the micro-benchmarks. The app reads its config at import time, so the
+scratch database and search backend are chosen here, before anything imports it.
+
+    pip install -r benchmarks/requirements.txt
+    python -m pytest benchmarks/bench_micro.py --benchmark-json=results.json
+
+BENCH_ITEMS, BENCH_VENDORS and BENCH_CUSTOMERS size the generated catalogue.
+'''
+
+import os
+import random
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='sellout-bench-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(SCRATCH, 'bench.db'))
+os.environ.setdefault('SEARCH_BACKEND', 'memory')
+os.environ.setdefault('SEARCH_SNAPSHOT', os.path.join(SCRATCH, 'search.snapshot'))
+
+@pytest.fixture(scope='session')
+def catalogue():
+    from app import app
+    from benchmarks.datagen import generate
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        summary = generate(int(os.environ.get('BENCH_ITEMS') or 10000),
+            int(os.environ.get('BENCH_VENDORS') or 1000),
+            int(os.environ.get('BENCH_CUSTOMERS') or 5000))
+    return summary
+
+@pytest.fixture
+def ctx(catalogue):
+    from app import app, db
+
+    with app.test_request_context():
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
@@ -0,0 +1,98 @@
+'''
+Synthetic Sellout catalogue for benchmarks: vendors, customers with carts, and items.
+Rows go in through bulk INSERTs, so a million items takes minutes rather than hours.
+
+    python -m benchmarks.datagen --items 100000 --vendors 2000 --customers 5000
+
+Point DATABASE_URL at a scratch database first; the tables are dropped and recreated.
+'''
+
+import argparse
+import random
+import time
+
+#titles and descriptions are built from these, so searches have a realistic spread of hits
+ADJECTIVES = ['red', 'blue', 'green', 'black', 'white', 'vintage', 'wireless', 'mechanical',
+    'leather', 'cotton', 'wool', 'steel', 'wooden', 'portable', 'compact', 'deluxe', 'classic',
+    'ergonomic', 'waterproof', 'organic', 'handmade', 'silver', 'golden', 'striped', 'plaid']
+NOUNS = ['keyboard', 'mouse', 'shirt', 'pants', 'hat', 'shoes', 'computer', 'stamp', 'lamp',
+    'chair', 'desk', 'mug', 'backpack', 'watch', 'scarf', 'jacket', 'monitor', 'speaker',
+    'notebook', 'pen', 'camera', 'blanket', 'bottle', 'guitar', 'headphones']
+PASSWORD = 'bench123'
+CHUNK = 10000
+
+def insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+def generate(items=10000, vendors=1000, customers=5000, cart_lines=3, featured=0.01, seed=0):
+    '''
+    Rebuild the database with >vendors< vendors, >customers< customers (each with a cart of
+    up to >cart_lines< items), one admin, and >items< items. Every user's password is
+    PASSWORD. Returns a summary dict with the row counts and how long it took.
+    '''
+
+    from app import app, db
+    from app.models import User, Item, Cart, CartItem
+
+    rng = random.Random(seed)
+    start = time.time()
+    db.drop_all()
+    db.create_all()
+
+    #hashing is deliberately slow, so every user shares one hash
+    probe = User()
+    probe.set_password(PASSWORD)
+    password_hash = probe.password_hash
+
+    users = [{'username': 'admin', 'email': 'admin@example.com', 'firstname': 'Ada',
+        'lastname': 'Admin', 'phone': '5550000000', 'usertype': 'Admin', 'address': '1 Main St',
+        'password_hash': password_hash}]
+    for kind, count in (('Vendor', vendors), ('Customer', customers)):
+        for i in range(count):
+            users.append({'username': '{}{}'.format(kind.lower(), i),
+                'email': '{}{}@example.com'.format(kind.lower(), i),
+                'firstname': kind, 'lastname': str(i), 'phone': '555{:07d}'.format(i),
+                'usertype': kind, 'address': '{} Fourth St'.format(i),
+                'password_hash': password_hash})
+    insert(db, User.__table__, users)
+    vendor_ids = list(range(2, vendors + 2))
+    customer_ids = list(range(vendors + 2, vendors + customers + 2))
+
+    rows = []
+    for i in range(items):
+        words = rng.sample(ADJECTIVES, 2) + [rng.choice(NOUNS)]
+        rows.append({'title': ' '.join(words).title(),
+            'description': 'A {} {} {}, item number {}.'.format(*(words + [i])),
+            'price': round(rng.uniform(1, 500), 2), 'stock': 10 ** 6,
+            'featured': rng.random() < featured, 'image': words[-1] + '.jpg',
+            'vendorid': rng.choice(vendor_ids)})
+    insert(db, Item.__table__, rows)
+
+    insert(db, Cart.__table__, [{'customerid': id, 'cartprice': 0.0} for id in customer_ids])
+    lines = []
+    for cartid in range(1, customers + 1):
+        for itemid in rng.sample(range(1, items + 1), min(items, rng.randint(0, cart_lines))):
+            lines.append({'cartid': cartid, 'itemid': itemid, 'quantity': rng.randint(1, 3)})
+    insert(db, CartItem.__table__, lines)
+    db.session.commit()
+    Cart.reconcile_prices()
+
+    Item.reindex()
+
+    return {'items': items, 'vendors': vendors, 'customers': customers,
+        'cart_lines': len(lines), 'seconds': round(time.time() - start, 2)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the database with a synthetic catalogue.')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--vendors', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--cart-lines', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        print(generate(args.items, args.vendors, args.customers, args.cart_lines,
+            seed=args.seed))
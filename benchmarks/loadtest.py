@@ -0,0 +1,149 @@
+'''
+Load driver for Sellout. Replays the main pages through Flask's test client from a few
+threads and reports p50/p99 latency and requests per second for each route.
+
+    python -m benchmarks.loadtest --requests 500 --threads 4 --output results.json
+
+Run it against a database filled by benchmarks.datagen. Routes may use {item}, {vendor}
+and {query}, which are filled with a random item id, vendor name and search phrase.
+Login rate limiting is turned off, since every thread logs in from the same address.
+'''
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+
+from benchmarks.datagen import ADJECTIVES, NOUNS, PASSWORD
+
+ROUTES = ['/', '/product/{item}', '/search?query={query}', '/vendor/{vendor}', '/cart']
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Driver(object):
+    '''
+    Sends requests for one route from several threads, each logged in as its own customer.
+    A failed login, or any response that isn't a 200 (such as /cart redirecting an
+    anonymous client), counts as an error.
+    '''
+
+    def __init__(self, app, items, vendors, customers, seed=0):
+        self.app = app
+        self.items = items
+        self.vendors = vendors
+        self.customers = customers
+        self.seed = seed
+
+    def client(self, number):
+        '''
+        A test client logged in as customer >number<, or None if the login failed.
+        '''
+
+        client = self.app.test_client()
+        response = client.post('/login', data={'username': 'customer{}'.format(
+            number % self.customers), 'password': PASSWORD, 'usertype': 'Customer'})
+        #a successful login redirects to the front page; anything else is a failure
+        if response.status_code != 302 or '/login' in response.headers['Location']:
+            return None
+        return client
+
+    def fill(self, route, rng):
+        return route.format(item=rng.randint(1, self.items),
+            vendor='vendor{}'.format(rng.randrange(self.vendors)),
+            query='{}+{}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS)))
+
+    def run(self, route, requests, threads=1, warmup=10):
+        '''
+        Returns the latency percentiles (ms), throughput and error count for >route<.
+        '''
+
+        timings = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def worker(number, count):
+            client = self.client(number)
+            if client is None:
+                with lock:
+                    errors[0] += 1
+                return
+            rng = random.Random(self.seed + number)
+            for i in range(warmup):
+                client.get(self.fill(route, rng))
+            mine = []
+            for i in range(count):
+                url = self.fill(route, rng)
+                start = time.perf_counter()
+                status = client.get(url).status_code
+                mine.append(time.perf_counter() - start)
+                if status != 200:
+                    with lock:
+                        errors[0] += 1
+            with lock:
+                timings.extend(mine)
+
+        pool = [threading.Thread(target=worker, args=(number, requests // threads))
+            for number in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if not timings:
+            return {'requests': 0, 'errors': errors[0], 'p50_ms': 0.0, 'p99_ms': 0.0,
+                'rps': 0.0}
+        return {'requests': len(timings), 'errors': errors[0],
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+            'rps': round(len(timings) / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure latency and throughput per route.')
+    parser.add_argument('--routes', nargs='*', default=ROUTES)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    #every thread logs in from the same address, which the login limiter would refuse
+    os.environ['LOGIN_RATE_STORE'] = ''
+    from app import app
+    from app.models import User, Item
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        items = Item.query.count()
+        vendors = User.query.filter_by(usertype='Vendor').count()
+        customers = User.query.filter_by(usertype='Customer').count()
+    driver = Driver(app, items, vendors, customers)
+
+    results = {'revision': revision(), 'timestamp': time.time(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'search_backend': app.config['SEARCH_BACKEND'],
+        'items': items, 'threads': args.threads, 'routes': {}}
+    for route in args.routes:
+        results['routes'][route] = result = driver.run(route, args.requests, args.threads,
+            args.warmup)
+        print('{:<28} p50 {p50_ms:>9.3f}ms  p99 {p99_ms:>9.3f}ms  {rps:>8.1f} req/s  '
+            '{errors} errors'.format(route, **result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
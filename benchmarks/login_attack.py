@@ -0,0 +1,124 @@
+'''
+Login throughput under a credential-stuffing burst. Attacker threads post wrong passwords
+for a few real usernames from a handful of addresses while other customers log in normally;
+the run is repeated with the login rate limiter switched off for comparison.
+
+    python -m benchmarks.login_attack --attackers 8 --customers 2 --targets 5 --seconds 5
+'''
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import PASSWORD
+from benchmarks.loadtest import percentile
+
+PEOPLE = 1000
+PROFILES = {
+    'limited': {'LOGIN_RATE_STORE': 'memory'},
+    'unlimited': {'LOGIN_RATE_STORE': ''},
+}
+
+def measure(attackers, customers, targets, seconds):
+    '''
+    Returns customer login latency and throughput, and what happened to the attack.
+    '''
+
+    from app import app
+    from benchmarks.datagen import generate
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        generate(items=100, vendors=10, customers=targets + PEOPLE)
+
+    stop = time.time() + seconds
+    logins = []
+    attempts = {}
+    lock = threading.Lock()
+
+    def attacker(number):
+        client = app.test_client()
+        rng = random.Random(number)
+        counts = {}
+        while time.time() < stop:
+            status = client.post('/login', data={'username': 'customer{}'.format(
+                rng.randrange(targets)), 'password': 'guess{}'.format(rng.random()),
+                'usertype': 'Customer'}, environ_base={
+                'REMOTE_ADDR': '10.0.0.{}'.format(number)}).status_code
+            counts[status] = counts.get(status, 0) + 1
+        with lock:
+            for status, count in counts.items():
+                attempts[status] = attempts.get(status, 0) + count
+
+    #each customer thread stands in for many different people, one login apiece
+    def customer(number):
+        client = app.test_client()
+        timings = []
+        while time.time() < stop:
+            person = number + len(timings) * customers
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': 'customer{}'.format(
+                targets + person % PEOPLE), 'password': PASSWORD, 'usertype': 'Customer'},
+                environ_base={'REMOTE_ADDR': '192.168.{}.{}'.format(person // 256 % 256,
+                person % 256)})
+            if response.status_code == 302 and '/login' not in response.location:
+                timings.append(time.perf_counter() - start)
+            client.get('/logout')
+        with lock:
+            logins.extend(timings)
+
+    pool = [threading.Thread(target=attacker, args=(number,)) for number in range(attackers)]
+    pool += [threading.Thread(target=customer, args=(number,)) for number in range(customers)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return {'logins_per_second': round(len(logins) / seconds, 1),
+        'login_p50_ms': round(percentile(logins, 0.50) * 1000, 1) if logins else None,
+        'login_p99_ms': round(percentile(logins, 0.99) * 1000, 1) if logins else None,
+        'attack_attempts': sum(attempts.values()), 'attack_refused': attempts.get(429, 0)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure logins during a login flood.')
+    parser.add_argument('--attackers', type=int, default=8)
+    parser.add_argument('--customers', type=int, default=2)
+    parser.add_argument('--targets', type=int, default=5, help='accounts under attack')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    #each profile runs in its own process, since the config is read when the app is imported
+    if args.profile:
+        print(json.dumps(measure(args.attackers, args.customers, args.targets, args.seconds)))
+        return
+
+    results = {'attackers': args.attackers, 'customers': args.customers,
+        'targets': args.targets, 'seconds': args.seconds, 'profiles': {}}
+    for name, settings in PROFILES.items():
+        scratch = tempfile.mkdtemp(prefix='sellout-login-')
+        env = dict(os.environ, SEARCH_BACKEND='memory',
+            SEARCH_SNAPSHOT=os.path.join(scratch, 'search.snapshot'),
+            DATABASE_URL='sqlite:///' + os.path.join(scratch, 'login.db'), **settings)
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.login_attack',
+            '--profile', name, '--attackers', str(args.attackers), '--customers',
+            str(args.customers), '--targets', str(args.targets), '--seconds', str(args.seconds)],
+            env=env)
+        results['profiles'][name] = result = json.loads(output.decode().splitlines()[-1])
+        print('{:<10} {logins_per_second:>7.1f} logins/s  p50 {login_p50_ms}ms  '
+            'p99 {login_p99_ms}ms  {attack_refused}/{attack_attempts} attack attempts '
+            'refused'.format(name, **result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
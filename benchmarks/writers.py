@@ -0,0 +1,90 @@
+'''
+Concurrent-writer throughput under the SQLite engine profile. Several threads each add
+items to their own cart as fast as they can; the run is repeated with the profile
+switched off (rollback journal, synchronous=FULL) for comparison.
+
+    python -m benchmarks.writers --threads 8 --seconds 5 --output writers.json
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    'tuned': {},
+    'default': {'SQLITE_WAL': '0', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0'},
+}
+
+def measure(threads, seconds):
+    '''
+    Run >threads< writers for >seconds< against DATABASE_URL and return commits per second.
+    '''
+
+    from app import app, db
+    from benchmarks.datagen import generate
+    from app.models import User, Item
+
+    with app.app_context():
+        generate(items=1000, vendors=10, customers=threads)
+        db.session.remove()
+
+    commits = [0] * threads
+    errors = [0] * threads
+    stop = time.time() + seconds
+
+    def writer(number):
+        with app.app_context():
+            cart = User.query.filter_by(username='customer{}'.format(number)).first().cart
+            items = Item.query.limit(100).all()
+            while time.time() < stop:
+                try:
+                    cart.add_item(items[commits[number] % len(items)])
+                    commits[number] += 1
+                except Exception:
+                    db.session.rollback()
+                    errors[number] += 1
+            db.session.remove()
+
+    pool = [threading.Thread(target=writer, args=(number,)) for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return {'commits_per_second': round(sum(commits) / seconds, 1), 'errors': sum(errors)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare writer throughput per engine profile.')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    #each profile runs in its own process, since the config is read when the app is imported
+    if args.profile:
+        print(json.dumps(measure(args.threads, args.seconds)))
+        return
+
+    results = {'threads': args.threads, 'seconds': args.seconds, 'profiles': {}}
+    for name, settings in PROFILES.items():
+        scratch = tempfile.mkdtemp(prefix='sellout-writers-')
+        env = dict(os.environ, SEARCH_BACKEND='memory',
+            SEARCH_SNAPSHOT=os.path.join(scratch, 'search.snapshot'),
+            DATABASE_URL='sqlite:///' + os.path.join(scratch, 'writers.db'), **settings)
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.writers',
+            '--profile', name, '--threads', str(args.threads), '--seconds', str(args.seconds)],
+            env=env)
+        results['profiles'][name] = result = json.loads(output.decode().splitlines()[-1])
+        print('{:<8} {commits_per_second:>9.1f} commits/s  {errors} errors'.format(name, **result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,57 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'abcdef'
     ITEMS_PER_PAGE = 10
+    ORDERS_PER_PAGE = int(os.environ.get('ORDERS_PER_PAGE') or 50)
+    USERS_PER_PAGE = int(os.environ.get('USERS_PER_PAGE') or 50)
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE') or 50)
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE') or 200)
+    QUERY_BUDGETS = bool(os.environ.get('QUERY_BUDGETS'))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 4096)
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL') or 300)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:150000'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH') or 8)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 4)
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 5)
+    LOGIN_RATE_STORE = os.environ.get('LOGIN_RATE_STORE', 'memory')
+    LOGIN_RATE_KEYS = int(os.environ.get('LOGIN_RATE_KEYS') or 100000)
+    LOGIN_RATE_DIR = os.environ.get('LOGIN_RATE_DIR') or os.path.join(basedir, 'ratelimit')
+    LOGIN_RATE_IP = float(os.environ.get('LOGIN_RATE_IP') or 1)
+    LOGIN_BURST_IP = float(os.environ.get('LOGIN_BURST_IP') or 20)
+    LOGIN_RATE_USER = float(os.environ.get('LOGIN_RATE_USER') or 0.1)
+    LOGIN_BURST_USER = float(os.environ.get('LOGIN_BURST_USER') or 5)
+    QUERY_LOG = os.environ.get('QUERY_LOG')
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 0)
+    FEATURED_ITEMS = int(os.environ.get('FEATURED_ITEMS') or 12)
+    FEATURED_CACHE_TTL = float(os.environ.get('FEATURED_CACHE_TTL') or 300)
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE')
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE') or 1024)
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL') or 60)
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or \
+        os.path.join(basedir, 'pagecache')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 10)
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20)
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT') or 10)
+    DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE') or 1800)
+    DATABASE_POOL_PRE_PING = os.environ.get('DATABASE_POOL_PRE_PING') != '0'
+    SQLITE_WAL = os.environ.get('SQLITE_WAL') != '0'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'elasticsearch'
+    SEARCH_SNAPSHOT = os.environ.get('SEARCH_SNAPSHOT') or \
+        os.path.join(basedir, 'search.snapshot')
     ELASTICSEARCH_URL = 'http://localhost:9200'
+    ELASTICSEARCH_BATCH_SIZE = int(os.environ.get('ELASTICSEARCH_BATCH_SIZE') or 500)
+    ELASTICSEARCH_FLUSH_INTERVAL = float(os.environ.get('ELASTICSEARCH_FLUSH_INTERVAL') or 1.0)
+    ELASTICSEARCH_QUEUE_SIZE = int(os.environ.get('ELASTICSEARCH_QUEUE_SIZE') or 10000)
+    SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE') or 512)
+    SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL') or 60)
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY') or 80)
     UPLOADED_PHOTOS_URL = os.environ.get('UPLOADED_PHOTOS_URL') or \
         'http://127.0.0.1:5000/static/img/'
     UPLOADED_PHOTOS_DEST = os.environ.get('UPLOADED_PHOTOS_DEST') or \
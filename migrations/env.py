@@ -71,6 +71,11 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search tables are managed by hand in their own migration
+    # (FTS5 virtual tables and their shadow tables), so autogenerate leaves them alone
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and reflected and '_fts' in name)
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
         prefix='sqlalchemy.',
@@ -82,6 +87,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,59 @@
+"""full-text search tables
+
+Revision ID: a63507667808
+Revises: 9a1a4027496c
+Create Date: 2026-10-18 13:20:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a63507667808'
+down_revision = '9a1a4027496c'
+branch_labels = None
+depends_on = None
+
+# searchable tables and their __searchable__ columns
+SEARCHABLE = {
+    'item': ['title', 'description'],
+    'tag': ['title'],
+}
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases keep using a separate search backend
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table, columns in SEARCHABLE.items():
+        names = ', '.join(columns)
+        new = ', '.join('new.' + column for column in columns)
+        old = ', '.join('old.' + column for column in columns)
+
+        # external-content table: the text lives in the real table, FTS5 only keeps the index
+        op.execute("CREATE VIRTUAL TABLE {0}_fts USING fts5({1}, content='{0}', content_rowid='id')"
+            .format(table, names))
+        op.execute("CREATE TRIGGER {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+            "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, {2}); END"
+            .format(table, names, new))
+        op.execute("CREATE TRIGGER {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+            "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, {2}); END"
+            .format(table, names, old))
+        # only fires when a searchable column changes, so stock updates don't touch the index
+        op.execute("CREATE TRIGGER {0}_fts_update AFTER UPDATE OF {1} ON {0} BEGIN "
+            "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, {2}); "
+            "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, {3}); END"
+            .format(table, names, old, new))
+        op.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in SEARCHABLE:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute('DROP TRIGGER IF EXISTS {0}_fts_{1}'.format(table, trigger))
+        op.execute('DROP TABLE IF EXISTS {0}_fts'.format(table))
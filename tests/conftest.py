@@ -0,0 +1,44 @@
+'''
+Fixtures for the test suite. The app reads its config at import time, so the scratch
+database and search backend are chosen here, before anything imports it.
+
+    python -m pytest tests
+'''
+
+import os
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='sellout-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'test.db')
+os.environ['SEARCH_BACKEND'] = 'memory'
+os.environ['SEARCH_SNAPSHOT'] = os.path.join(SCRATCH, 'search.snapshot')
+os.environ['LOGIN_RATE_STORE'] = ''
+os.environ['RESPONSE_CACHE'] = ''
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from benchmarks.datagen import generate
+
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        generate(items=200, vendors=5, customers=10, featured=0.2)
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def login(client):
+    from benchmarks.datagen import PASSWORD
+
+    def login(username, usertype):
+        response = client.post('/login', data={'username': username, 'password': PASSWORD,
+            'usertype': usertype})
+        assert response.status_code == 302 and '/login' not in response.headers['Location']
+        return client
+    return login
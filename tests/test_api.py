@@ -0,0 +1,44 @@
+def test_etag_answers_304(client):
+    response = client.get('/api/v1/items/1')
+    assert response.status_code == 200 and response.headers['ETag']
+    again = client.get('/api/v1/items/1', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304 and not again.data
+
+def test_fields(client):
+    response = client.get('/api/v1/items?fields=title,price&limit=2')
+    assert [sorted(row) for row in response.get_json()['data']] == [['id', 'price', 'title']] * 2
+    response = client.get('/api/v1/items?fields=title,password_hash')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown fields: password_hash.'}
+
+def test_sign_in_required(client, login):
+    assert client.get('/api/v1/cart').status_code == 401
+    assert client.get('/api/v1/vendor/orders').status_code == 401
+    login('customer4', 'Customer')
+    assert client.get('/api/v1/cart').status_code == 200
+    assert client.get('/api/v1/vendor/orders').status_code == 403
+
+def test_requests_must_be_json(client, login):
+    login('customer4', 'Customer')
+    response = client.post('/api/v1/cart/items', data={'itemid': 1})
+    assert response.status_code == 415
+    assert client.post('/api/v1/checkout').status_code == 415
+
+def test_batch_with_unknown_item_changes_nothing(client, login):
+    login('customer5', 'Customer')
+    before = client.get('/api/v1/cart').get_json()
+    response = client.post('/api/v1/cart/batch', json={'items': {'196': 2, '99999': 1}})
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'No such items: 99999.'}
+    assert client.get('/api/v1/cart').get_json() == before
+
+def test_batch_and_bodyless_delete(client, login):
+    login('customer5', 'Customer')
+    response = client.post('/api/v1/cart/batch', json={'items': {'196': 2, '197': 1}})
+    assert response.status_code == 200
+    lines = dict((line['itemid'], line['quantity']) for line in response.get_json()['lines'])
+    assert lines[196] == 2 and lines[197] == 1
+
+    response = client.delete('/api/v1/cart/items/196')
+    assert response.status_code == 200
+    assert 196 not in [line['itemid'] for line in response.get_json()['lines']]
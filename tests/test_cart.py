@@ -0,0 +1,97 @@
+import pytest
+
+@pytest.fixture
+def cart(app):
+    from app import db
+    from app.models import User, CartItem
+
+    with app.app_context():
+        cart = User.query.filter_by(username='customer7').first().cart
+        CartItem.query.filter_by(cartid=cart.id).delete()
+        cart.cartprice = 0.0
+        db.session.commit()
+        yield cart
+        db.session.rollback()
+
+def stock(cart, items):
+    '''
+    Set the stock of each Item id in >items< to its count and put two of each in >cart<.
+    '''
+
+    from app import db
+    from app.models import Item
+
+    for itemid, count in items.items():
+        item = Item.query.get(itemid)
+        item.stock = count
+        db.session.commit()
+        cart.add_item(item, 2)
+
+def test_checkout_reserves_stock_and_places_orders(cart):
+    from app.models import Item, CartItem, Order
+
+    stock(cart, {190: 5, 191: 2})
+    vendors = dict((id, Item.query.get(id).vendorid) for id in (190, 191))
+    before = Order.query.count()
+
+    assert cart.checkout() == (2, [])
+    assert [Item.query.get(id).stock for id in (190, 191)] == [3, 0]
+    orders = Order.query.filter(Order.customerid == cart.customerid).order_by(Order.id.desc()
+        ).limit(2).all()
+    assert Order.query.count() == before + 2
+    assert sorted((order.itemid, order.quantity, order.vendorid) for order in orders) == [
+        (190, 2, vendors[190]), (191, 2, vendors[191])]
+    assert not CartItem.query.filter_by(cartid=cart.id).count()
+    assert cart.cartprice == 0.0
+
+def test_short_stock_changes_nothing(cart):
+    from app.models import Item, CartItem, Order
+
+    stock(cart, {192: 5, 193: 1})
+    before = Order.query.count()
+
+    placed, short = cart.checkout()
+    assert placed == 0
+    assert [item.id for item in short] == [193]
+    assert [Item.query.get(id).stock for id in (192, 193)] == [5, 1]
+    assert Order.query.count() == before
+    assert CartItem.query.filter_by(cartid=cart.id).count() == 2
+
+def add_concurrently(app, cartid, itemid, threads=4, times=25):
+    from threading import Thread
+    from app import db
+    from app.models import CartItem
+
+    def add():
+        with app.app_context():
+            for _ in range(times):
+                CartItem.add(cartid, itemid, 1)
+                db.session.commit()
+            db.session.remove()
+
+    workers = [Thread(target=add) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def test_concurrent_adds_share_one_line(app, cart):
+    from app.models import CartItem
+
+    add_concurrently(app, cart.id, 194)
+    lines = CartItem.query.filter_by(cartid=cart.id, itemid=194).all()
+    assert [line.quantity for line in lines] == [100]
+
+def test_add_without_on_conflict(app, cart, monkeypatch):
+    from types import SimpleNamespace
+    from app import db, models
+    from app.models import CartItem
+
+    #SQLite before 3.24 takes the UPDATE-then-INSERT branch
+    monkeypatch.setattr(models, 'sqlite3', SimpleNamespace(sqlite_version_info=(3, 20, 0)))
+    assert CartItem.add(cart.id, 195, 2) == 2
+    assert CartItem.add(cart.id, 195, 3) == 5
+    db.session.commit()
+    add_concurrently(app, cart.id, 195, threads=2, times=5)
+    lines = CartItem.query.filter_by(cartid=cart.id, itemid=195).all()
+    assert [line.quantity for line in lines] == [15]
@@ -0,0 +1,50 @@
+def test_featured_cards_dropped_on_commit_only(app):
+    from app import db
+    from app.featured import card_cache, featured_cards
+    from app.models import Item
+
+    with app.test_request_context():
+        featured_cards()
+        item = Item.query.filter_by(featured=True).first()
+        title = item.title
+        item.title = 'Rolled back'
+        db.session.flush()
+        assert card_cache.get('featured') is not None
+
+        #a rollback forgets the mark, so the next commit has nothing to drop
+        db.session.rollback()
+        db.session.commit()
+        assert card_cache.get('featured') is not None
+
+        item.title = 'Committed'
+        db.session.commit()
+        assert card_cache.get('featured') is None
+        item.title = title
+        db.session.commit()
+
+def test_user_snapshot_forgotten_on_commit(app):
+    from app import db
+    from app.identity import load_user, user_cache
+    from app.models import User
+
+    with app.app_context():
+        user = User.query.filter_by(username='customer8').first()
+        assert load_user(user.id).firstname == user.firstname
+        user.firstname = 'Renamed'
+        db.session.commit()
+        assert user_cache.get(user.id) is None
+        assert load_user(user.id).firstname == 'Renamed'
+
+def test_cards_rendered_across_a_commit_not_kept(app, monkeypatch):
+    from app import featured
+
+    #stands in for a commit that drops the cards while they're being rendered
+    def render_template(template, product):
+        featured.invalidate_featured()
+        return ''
+
+    monkeypatch.setattr(featured, 'render_template', render_template)
+    with app.app_context():
+        featured.invalidate_featured()
+        assert featured.featured_cards()
+        assert featured.card_cache.get('featured') is None
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from app.search import IndexQueue
+
+class FakeClient(object):
+    '''
+    Records every _bulk request as a list of (op, index, id, body).
+    '''
+
+    def __init__(self):
+        self.requests = []
+        self.sent = threading.Event()
+
+    def bulk(self, body):
+        operations = []
+        actions = iter(body)
+        for action in actions:
+            op, meta = list(action.items())[0]
+            operations.append((op, meta['_index'], meta['_id'],
+                next(actions) if op == 'index' else None))
+        self.requests.append(operations)
+        self.sent.set()
+
+    def wait(self, timeout=2.0):
+        sent = self.sent.wait(timeout)
+        self.sent.clear()
+        return sent
+
+def queue_for(client, **options):
+    return IndexQueue(lambda: client, **options)
+
+def test_flush_interval_sends_entries_after_idle(app):
+    client = FakeClient()
+    queue = queue_for(client, batch_size=100, flush_interval=0.1)
+    try:
+        for id in (1, 2, 3):
+            queue.enqueue('item', id, 'delete')
+            assert client.wait()
+            #the worker is now asleep on an empty queue until the next entry wakes it
+            time.sleep(0.2)
+        assert [request[0][2] for request in client.requests] == [1, 2, 3]
+    finally:
+        queue.stop()
+
+def test_full_batch_is_sent_without_waiting(app):
+    client = FakeClient()
+    queue = queue_for(client, batch_size=3, flush_interval=60)
+    try:
+        for id in (1, 2, 3):
+            queue.enqueue('item', id, 'delete')
+        assert client.wait()
+        assert sorted(op[2] for op in client.requests[0]) == [1, 2, 3]
+    finally:
+        queue.stop()
+
+def test_repeated_entries_are_coalesced(app):
+    client = FakeClient()
+    queue = queue_for(client, batch_size=100, flush_interval=60)
+    queue.enqueue('item', 1, 'index', {'title': 'first'})
+    queue.enqueue('item', 1, 'index', {'title': 'second'})
+    queue.enqueue('item', 2, 'index', {'title': 'other'})
+    queue.enqueue('item', 2, 'delete')
+    queue.stop()
+    assert sorted(client.requests[0], key=lambda op: op[2]) == [
+        ('index', 'item', 1, {'title': 'second'}), ('delete', 'item', 2, None)]
+
+def test_full_queue_drops_after_timeout(app):
+    client = FakeClient()
+    queue = queue_for(client, batch_size=100, flush_interval=60, max_pending=2,
+        put_timeout=0.05)
+    queue.enqueue('item', 1, 'delete')
+    queue.enqueue('item', 2, 'delete')
+    start = time.time()
+    queue.enqueue('item', 3, 'delete')
+    assert time.time() - start >= 0.05
+    assert queue.dropped == 1
+    #an entry for a document already waiting replaces it instead of needing room
+    queue.enqueue('item', 2, 'index', {'title': 'two'})
+    assert queue.dropped == 1
+    queue.stop()
+    assert sorted(op[2] for op in client.requests[0]) == [1, 2]
+
+def test_stop_sends_whatever_is_left(app):
+    client = FakeClient()
+    queue = queue_for(client, batch_size=100, flush_interval=60)
+    queue.enqueue('item', 1, 'delete')
+    queue.enqueue('tag', 7, 'index', {'name': 'red'})
+    queue.stop()
+    assert not queue.pending
+    assert sorted((op[1], op[2]) for op in client.requests[0]) == [('item', 1), ('tag', 7)]
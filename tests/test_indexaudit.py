@@ -0,0 +1,19 @@
+def test_full_scans_not_reported(app):
+    from app.indexaudit import FULL_SCAN, audit_indexes
+
+    scan = 'UPDATE cart SET cartprice=? WHERE cart.cartprice IS NULL'
+    indexed = 'SELECT cart.id FROM cart WHERE cart.customerid = ?'
+    with app.app_context():
+        assert list(audit_indexes([scan, indexed])) == [('cart', 'cartprice')]
+        assert not audit_indexes([scan.replace('UPDATE', 'UPDATE ' + FULL_SCAN), indexed])
+
+def test_reconcile_prices_marked(app, monkeypatch):
+    from app import indexaudit
+    from app.models import Cart
+
+    monkeypatch.setitem(app.config, 'QUERY_LOG', 'unused.json')
+    monkeypatch.setattr(indexaudit, 'query_shapes', set())
+    with app.app_context():
+        Cart.reconcile_prices()
+    assert any(statement.startswith('UPDATE ' + indexaudit.FULL_SCAN)
+        for statement in indexaudit.query_shapes)
@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+def test_failed_statement_leaves_nothing_behind(app):
+    from app import db
+
+    with app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute('SELECT * FROM no_such_table')
+        connection.execute('SELECT 1')
+        assert not connection.info.get('instrumentation_start')
+
+def test_requests_counted(client):
+    from app.instrumentation import metrics
+
+    def queries():
+        return metrics.endpoints.get('product', {}).get('sql_queries', 0)
+
+    before = queries()
+    assert client.get('/product/3').status_code == 200
+    assert queries() > before
@@ -0,0 +1,31 @@
+import pytest
+
+@pytest.fixture(params=['memory', 'file'])
+def store(request, app, tmp_path):
+    from app.pagecache import MemoryStore, FileStore
+
+    if request.param == 'memory':
+        return MemoryStore(10, 60)
+    return FileStore(str(tmp_path), 60)
+
+def test_page_kept(store):
+    store.set('/', ('page', 'text/html', 'etag'), store.generation())
+    assert store.get('/') == ('page', 'text/html', 'etag')
+    store.clear()
+    assert store.get('/') is None
+
+def test_page_rendered_across_a_clear_not_kept(store):
+    generation = store.generation()
+    store.clear()
+    store.set('/', ('stale', 'text/html', 'etag'), generation)
+    assert store.get('/') is None
+
+def test_file_store_generation_shared(tmp_path):
+    from app.pagecache import FileStore
+
+    #a clear in one worker stops a page another worker is rendering
+    first, second = FileStore(str(tmp_path), 60), FileStore(str(tmp_path), 60)
+    generation = second.generation()
+    first.clear()
+    second.set('/', ('stale', 'text/html', 'etag'), generation)
+    assert first.get('/') is None and second.get('/') is None
@@ -0,0 +1,28 @@
+from werkzeug.security import generate_password_hash
+
+def test_resolved_method_needs_no_rehash(app, monkeypatch):
+    from app.passwords import needs_rehash
+
+    #werkzeug writes pbkdf2:sha256 into the hash with its iteration count filled in
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    assert not needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256',
+        app.config['PASSWORD_SALT_LENGTH']))
+    assert needs_rehash(generate_password_hash('secret', 'pbkdf2:sha1',
+        app.config['PASSWORD_SALT_LENGTH']))
+
+def test_busy_rehash_still_logs_in(app, monkeypatch):
+    from app import models
+    from app.models import User
+    from app.passwords import HashingBusy
+    from benchmarks.datagen import PASSWORD
+
+    def busy(password):
+        raise HashingBusy()
+
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha1')
+    monkeypatch.setattr(models, 'hash_password', busy)
+    with app.app_context():
+        user = User.query.filter_by(username='customer3').first()
+        old = user.password_hash
+        assert user.check_password(PASSWORD)
+        assert user.password_hash == old
@@ -0,0 +1,32 @@
+'''
+Render every view with a @query_budget against seeded data. Under TESTING the budget is
+enforced, so a view that sends more statements than it allows raises AssertionError.
+'''
+
+import pytest
+
+ANONYMOUS = ['/', '/product/1', '/search?query=item', '/user/customer0']
+
+@pytest.mark.parametrize('url', ANONYMOUS)
+def test_anonymous_pages(client, url):
+    assert client.get(url).status_code == 200
+
+@pytest.mark.parametrize('url', ['/', '/product/1', '/cart', '/search?query=item',
+    '/user/customer1'])
+def test_customer_pages(login, url):
+    assert login('customer1', 'Customer').get(url).status_code == 200
+
+def test_checkout(login):
+    client = login('customer2', 'Customer')
+    assert client.post('/product/1', data={'submit': 'Add to Cart'}).status_code == 302
+    assert client.get('/cart').status_code == 200
+    response = client.get('/cart/checkout')
+    assert response.status_code == 302 and response.headers['Location'].endswith('/index')
+
+@pytest.mark.parametrize('url', ['/vendor/vendor0', '/vendor/vendor1'])
+def test_vendor_pages(login, url):
+    assert login('vendor0', 'Vendor').get(url).status_code == 200
+
+def test_admin_page(login):
+    #admins can log in whichever type is picked
+    assert login('admin', 'Customer').get('/admin/admin').status_code == 200
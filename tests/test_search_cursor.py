@@ -0,0 +1,15 @@
+import pytest
+
+from app.search import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor([1.5, 42])) == [1.5, '42']
+
+@pytest.mark.parametrize('cursor', ['1.0,abc', 'abc,1', '1.0', 'nan,1', ''])
+def test_mangled_cursor_is_ignored(cursor):
+    assert decode_cursor(cursor) is None
+
+@pytest.mark.parametrize('url', ['/search?query=item&page=2&after=1.0,abc',
+    '/api/v1/search?q=item&page=2&after=1.0,abc'])
+def test_mangled_cursor_falls_back_to_page_number(client, url):
+    assert client.get(url).status_code == 200
@@ -0,0 +1,43 @@
+import os
+
+from app.search import MemoryBackend
+
+def ids(backend, query):
+    return backend.query('item', query, 1, 10)[0]
+
+def test_workers_share_changes_through_the_snapshot(app, tmpdir):
+    snapshot = str(tmpdir.join('search.snapshot'))
+    one = MemoryBackend(snapshot, interval=0)
+    two = MemoryBackend(snapshot, interval=0)
+
+    one.enqueue('item', 1, 'index', {'title': 'red lamp'})
+    two.enqueue('item', 2, 'index', {'title': 'red chair'})
+    #one saved before two changed anything, so two merged one's change into its save
+    assert sorted(ids(one, 'red')) == [1, 2]
+    assert sorted(ids(two, 'red')) == [1, 2]
+
+    one.enqueue('item', 1, 'delete')
+    assert ids(two, 'red') == [2]
+
+def test_reindex_snapshot_reaches_running_workers(app, tmpdir):
+    snapshot = str(tmpdir.join('search.snapshot'))
+    worker = MemoryBackend(snapshot, interval=60)
+    worker.enqueue('item', 1, 'index', {'title': 'blue lamp'})
+
+    MemoryBackend(snapshot).rebuild('item', [[(5, {'title': 'green lamp'})]])
+    #the worker keeps its own unsaved change on top of the rebuilt index
+    assert sorted(ids(worker, 'lamp')) == [1, 5]
+    worker.save()
+    assert sorted(ids(MemoryBackend(snapshot), 'lamp')) == [1, 5]
+
+def test_changes_during_rebuild_are_kept(app, tmpdir):
+    backend = MemoryBackend(str(tmpdir.join('search.snapshot')))
+
+    def batches():
+        yield [(1, {'title': 'old title'})]
+        backend.enqueue('item', 1, 'index', {'title': 'new title'})
+        backend.enqueue('item', 2, 'index', {'title': 'new arrival'})
+
+    backend.rebuild('item', batches())
+    assert sorted(ids(backend, 'new')) == [1, 2]
+    assert ids(backend, 'old') == []
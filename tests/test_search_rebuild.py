@@ -0,0 +1,88 @@
+import pytest
+
+from app.search import ElasticsearchBackend
+
+class FakeIndices(object):
+    def __init__(self, es):
+        self.es = es
+
+    def create(self, index):
+        self.es.documents[index] = {}
+
+    def refresh(self, index):
+        pass
+
+    def exists(self, index):
+        return index in self.es.documents
+
+    def exists_alias(self, name):
+        return name in self.es.aliases
+
+    def get_alias(self, name):
+        return {self.es.aliases[name]: {}}
+
+    def update_aliases(self, body):
+        for action in body['actions']:
+            if 'add' in action:
+                self.es.aliases[action['add']['alias']] = action['add']['index']
+
+    def delete(self, index, ignore=None):
+        del self.es.documents[index]
+
+class FakeElasticsearch(object):
+    '''
+    Just enough of the client for rebuild(): indexes are dicts of id -> document, and
+    aliases map to one index.
+    '''
+
+    def __init__(self):
+        self.documents = {'item-1': {1: {'title': 'stale'}}}
+        self.aliases = {'item': 'item-1'}
+        self.indices = FakeIndices(self)
+
+    def bulk(self, body, index=None):
+        actions = iter(body)
+        for action in actions:
+            op, meta = list(action.items())[0]
+            name = self.aliases.get(meta['_index'], meta['_index'])
+            if op == 'index':
+                self.documents.setdefault(name, {})[meta['_id']] = next(actions)
+            else:
+                self.documents.get(name, {}).pop(meta['_id'], None)
+        return {'errors': False, 'items': []}
+
+@pytest.fixture
+def backend(app):
+    backend = ElasticsearchBackend(None, client=FakeElasticsearch(), flush_interval=0.01)
+    yield backend
+    backend.queue.stop()
+
+def test_changes_during_load_reach_new_index(backend):
+    es = backend.client
+
+    def batches():
+        yield [(1, {'title': 'old one'}), (2, {'title': 'old two'})]
+        #changes committed while the load runs: one to a row already sent
+        backend.enqueue('item', 1, 'index', {'title': 'new one'})
+        backend.enqueue('item', 2, 'delete')
+        backend.enqueue('item', 3, 'index', {'title': 'new three'})
+        yield [(4, {'title': 'four'})]
+
+    target = backend.rebuild('item', batches(), workers=1)
+    assert es.aliases == {'item': target}
+    assert es.documents == {target: {1: {'title': 'new one'}, 3: {'title': 'new three'},
+        4: {'title': 'four'}}}
+    assert not backend.queue.mirrors
+
+def test_failed_load_deletes_new_index(backend):
+    es = backend.client
+
+    def batches():
+        yield [(1, {'title': 'one'})]
+        raise RuntimeError('database went away')
+
+    with pytest.raises(RuntimeError):
+        backend.rebuild('item', batches(), workers=1)
+    assert es.aliases == {'item': 'item-1'}
+    assert list(es.documents) == ['item-1']
+    assert not backend.queue.mirrors